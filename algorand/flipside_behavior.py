@@ -1,10 +1,12 @@
 import altair as alt
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy.stats import spearmanr, linregress
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
 
 st.set_page_config(page_title="Flipside Algorand Wallet Behavior", page_icon="🅰️")
 st.title("Flipside Algorand Wallet Behavior")
@@ -24,11 +26,11 @@ def load_data():
     # summary info
     q = "1b363710-ae95-410e-a2f7-b9d7c980d8d3"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    summary = pd.read_json(url)
+    summary = read_query(url, ttl=3600 * 72)
     # asa info
     q = "da1bc16f-3d30-4e64-9d59-d9656e9eafc0"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    asa = pd.read_json(url)
+    asa = read_query(url, ttl=3600 * 72)
     return summary, asa
 
 
@@ -446,6 +448,9 @@ def corrfunc(x, y, ax=None, **kws):
     """Plot the correlation coefficient in the top left hand corner of a plot.
     https://stackoverflow.com/questions/50832204/show-correlation-values-in-pairplot-using-seaborn-in-python
     """
+    import matplotlib.pyplot as plt
+    from scipy.stats import spearmanr, linregress
+
     r, p = spearmanr(x, y)
     lr = linregress(x, y)
     if lr.intercept < 0:
@@ -478,6 +483,11 @@ def corrfunc(x, y, ax=None, **kws):
 # st.altair_chart(chart, use_container_width=True)
 @st.cache(allow_output_mutation=True, ttl=3600 * 72)
 def pairwise_plot():
+    # matplotlib and seaborn are only needed for the pairplot, so they are
+    # imported here to keep them off the first page load
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     fig, ax = plt.subplots()
     g = sns.pairplot(pairplot_df)
     g.map_lower(corrfunc)
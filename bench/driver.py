@@ -0,0 +1,242 @@
+"""Run one dashboard script headlessly and record per-phase timings.
+
+This is started in a fresh interpreter by ``bench/run.py`` for every entry
+point, so the first run measures a cold start. The script is executed with
+``runpy`` in Streamlit's bare mode (widgets return their defaults), then
+re-executed ``--reruns`` times in the same process to measure reruns with
+warm ``st.cache`` entries.
+
+Wall time is split into exclusive phases by wrapping well-known functions as
+their modules are imported:
+
+- ``import``: every ``import`` statement
+- ``load``: HTTP requests, ``pd.read_json``/``pd.read_csv``, the query cache
+  and Feather reads/writes
+- ``chart``: Altair serialization, ``st.altair_chart``/``st.pyplot`` and other
+  chart elements, seaborn plots, matplotlib ``savefig`` and pyvis output
+- ``transform``: everything else
+
+The time of the first rendered element (``first_paint``) is recorded too,
+along with which of ``--deferred`` modules had already been imported by then.
+
+Only the main thread is timed; worker threads (e.g. ``read_queries``) are
+accounted for by the main-thread call that waits on them.
+"""
+
+import argparse
+import builtins
+import functools
+import json
+import resource
+import runpy
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict
+from pathlib import Path
+
+PHASES = ("import", "load", "transform", "chart")
+
+
+class PhaseClock:
+    """Exclusive wall time per phase, for nested calls on the main thread"""
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self._stack = []
+        self._main = threading.main_thread()
+
+    def start(self, phase="transform"):
+        self._stack = [[phase, time.perf_counter()]]
+
+    def enter(self, phase):
+        if threading.current_thread() is not self._main or not self._stack:
+            return False
+        now = time.perf_counter()
+        top = self._stack[-1]
+        self.totals[top[0]] += now - top[1]
+        self._stack.append([phase, now])
+        return True
+
+    def exit(self):
+        now = time.perf_counter()
+        phase, start = self._stack.pop()
+        self.totals[phase] += now - start
+        self._stack[-1][1] = now
+
+    def stop(self):
+        while len(self._stack) > 1:
+            self.exit()
+        phase, start = self._stack.pop()
+        self.totals[phase] += time.perf_counter() - start
+        totals = {p: round(self.totals.get(p, 0.0), 6) for p in PHASES}
+        self.totals = defaultdict(float)
+        return totals
+
+
+clock = PhaseClock()
+first_paint = {}
+
+
+def timed(phase, func):
+    if getattr(func, "_bench_phase", None):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        entered = clock.enter(phase)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if entered:
+                clock.exit()
+
+    wrapper._bench_phase = phase
+    return wrapper
+
+
+def _patch_attrs(obj, phase, names):
+    for name in names:
+        if hasattr(obj, name):
+            setattr(obj, name, timed(phase, getattr(obj, name)))
+
+
+def _mark_first_paint(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if first_paint.get("time") is None:
+            first_paint["time"] = time.perf_counter()
+            first_paint["modules"] = set(sys.modules)
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def _patch_streamlit(module):
+    module.DeltaGenerator._enqueue = _mark_first_paint(module.DeltaGenerator._enqueue)
+    _patch_attrs(
+        module.DeltaGenerator,
+        "chart",
+        [
+            "altair_chart",
+            "vega_lite_chart",
+            "pyplot",
+            "plotly_chart",
+            "pydeck_chart",
+            "line_chart",
+            "area_chart",
+            "bar_chart",
+        ],
+    )
+
+
+def _patch_seaborn(module):
+    _patch_attrs(module, "chart", [n for n in dir(module) if n.endswith("plot")])
+
+
+# Module name -> function patching it, applied right after the module is
+# first imported so that names bound with ``from x import y`` are wrapped too
+PATCHES = {
+    "requests.adapters": lambda m: _patch_attrs(m.HTTPAdapter, "load", ["send"]),
+    "pandas": lambda m: _patch_attrs(m, "load", ["read_json", "read_csv"]),
+    "pyarrow.feather": lambda m: _patch_attrs(
+        m, "load", ["read_table", "write_feather"]
+    ),
+    "common.data_cache": lambda m: _patch_attrs(
+        m, "load", ["read_query", "read_queries"]
+    ),
+    "streamlit.delta_generator": _patch_streamlit,
+    "streamlit.components.v1": lambda m: _patch_attrs(m, "chart", ["html"]),
+    "altair.vegalite.v4.api": lambda m: _patch_attrs(
+        m.TopLevelMixin, "chart", ["to_dict"]
+    ),
+    "matplotlib.figure": lambda m: _patch_attrs(m.Figure, "chart", ["savefig"]),
+    "seaborn": _patch_seaborn,
+    "pyvis.network": lambda m: _patch_attrs(
+        m.Network, "chart", ["show", "save_graph", "write_html", "generate_html"]
+    ),
+}
+_pending = dict(PATCHES)
+_original_import = builtins.__import__
+
+
+def _apply_patches():
+    for name in list(_pending):
+        module = sys.modules.get(name)
+        # Wait until the module has finished executing
+        if module is None or getattr(module.__spec__, "_initializing", False):
+            continue
+        _pending.pop(name)(module)
+
+
+def _timed_import(*args, **kwargs):
+    entered = clock.enter("import")
+    try:
+        return _original_import(*args, **kwargs)
+    finally:
+        if entered:
+            clock.exit()
+        if _pending:
+            _apply_patches()
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_script(script: Path, reruns: int, deferred=()) -> dict:
+    sys.argv = [str(script)]
+    sys.path.insert(0, str(script.parent))
+    builtins.__import__ = _timed_import
+    _apply_patches()
+
+    runs = []
+    for _ in range(reruns + 1):
+        first_paint.clear()
+        clock.start()
+        start = time.perf_counter()
+        error = None
+        try:
+            runpy.run_path(str(script), run_name="__main__")
+        except BaseException as e:  # scripts may call st.stop() or sys.exit()
+            if not isinstance(e, SystemExit) or e.code:
+                error = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+        paint = first_paint.get("time")
+        loaded = first_paint.get("modules", set(sys.modules))
+        runs.append(
+            {
+                "wall_time": round(time.perf_counter() - start, 6),
+                "first_paint": None if paint is None else round(paint - start, 6),
+                "phases": clock.stop(),
+                "peak_rss_mb": peak_rss_mb(),
+                "eager_imports": sorted(m for m in deferred if m in loaded),
+            }
+        )
+        if error is not None:
+            runs[-1]["error"] = error
+            break
+    return {"status": "error" if "error" in runs[-1] else "ok", "runs": runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", type=Path)
+    parser.add_argument("--reruns", type=int, default=1)
+    parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument(
+        "--deferred",
+        nargs="*",
+        default=[],
+        help="modules that should not be imported before the first element renders",
+    )
+    args = parser.parse_args()
+
+    result = run_script(args.script, args.reruns, args.deferred)
+    args.output.write_text(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
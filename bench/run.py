@@ -0,0 +1,282 @@
+"""Cold-start and rerun benchmarks for every dashboard script.
+
+Each entry point is run headlessly in its own interpreter (see
+``bench/driver.py``) with HTTP traffic replayed from ``cassettes/`` and an
+empty query cache, so results only depend on the code. Record the fixtures
+once with ``FLIPSIDE_HTTP_MODE=record`` (see the README), then:
+
+    python bench/run.py                        # writes bench/results/<commit>.json
+    python bench/run.py --only near/finance.py --reruns 3
+    python bench/run.py compare bench/results/abc1234.json bench/results/def5678.json
+
+The cold run is started with ``-X importtime``; the slowest top-level imports
+are stored with the results, and the run fails if any script imports one of
+``DEFERRED_IMPORTS`` before its first element has rendered.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+REPO = Path(__file__).resolve().parents[1]
+RESULTS_DIR = REPO / "bench" / "results"
+
+ENTRY_POINTS = [
+    "near/finance.py",
+    "near/government.py",
+    "near/journey.py",
+    "near/arts_district.py",
+    "near/citizens_of_NEAR_users.py",
+    "terra/*.py",
+    "solana/*.py",
+    "flow/01_all_day.py",
+    "algorand/flipside_behavior.py",
+]
+
+# Heavy libraries that should only be imported by the sections using them
+DEFERRED_IMPORTS = ["arch", "matplotlib", "networkx", "pyvis", "scipy", "seaborn"]
+
+# Number of top-level imports kept in the import time report
+IMPORT_REPORT_SIZE = 15
+
+# Metrics compared between two result files
+METRICS = {
+    "cold": lambda r: r["runs"][0]["wall_time"],
+    "paint": lambda r: r["runs"][0]["first_paint"],
+    "rerun": lambda r: min(x["wall_time"] for x in r["runs"][1:]),
+    "import": lambda r: r["runs"][0]["phases"]["import"],
+    "load": lambda r: r["runs"][0]["phases"]["load"],
+    "transform": lambda r: r["runs"][0]["phases"]["transform"],
+    "chart": lambda r: r["runs"][0]["phases"]["chart"],
+    "rss_mb": lambda r: r["runs"][-1]["peak_rss_mb"],
+}
+
+
+def entry_points(only=None):
+    scripts = []
+    for pattern in ENTRY_POINTS:
+        scripts.extend(sorted(REPO.glob(pattern)))
+    scripts = [str(s.relative_to(REPO)) for s in scripts]
+    if only:
+        scripts = [s for s in scripts if s in only]
+    return scripts
+
+
+def git_commit():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return out.stdout.strip()
+
+
+def parse_importtime(stderr):
+    """Split ``-X importtime`` output from other stderr lines
+
+    Returns the cumulative import time in milliseconds of each top-level
+    package imported directly by the script (or the benchmark driver), slowest
+    first, and the remaining stderr.
+    """
+    pattern = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+    totals = {}
+    other = []
+    for line in stderr.splitlines():
+        match = pattern.match(line)
+        if match is None:
+            if not line.startswith("import time:"):
+                other.append(line)
+            continue
+        _, cumulative, indent, name = match.groups()
+        if not indent:
+            package = name.split(".")[0]
+            totals[package] = totals.get(package, 0) + int(cumulative) / 1000
+    report = sorted(totals.items(), key=lambda x: x[1], reverse=True)
+    report = {k: round(v, 1) for k, v in report[:IMPORT_REPORT_SIZE]}
+    return report, "\n".join(other)
+
+
+def run_entry_point(script, reruns, mode, cache_dir=None, verbose=False):
+    """Run one script in a fresh interpreter and return its results"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output = Path(tmp) / "result.json"
+        env = dict(
+            os.environ,
+            FLIPSIDE_HTTP_MODE=mode,
+            FLIPSIDE_CACHE_DIR=cache_dir or str(Path(tmp) / "cache"),
+        )
+        cmd = [
+            sys.executable,
+            "-X",
+            "importtime",
+            str(REPO / "bench" / "driver.py"),
+            script,
+            "--reruns",
+            str(reruns),
+            "--output",
+            str(output),
+            "--deferred",
+            *DEFERRED_IMPORTS,
+        ]
+        start = time.perf_counter()
+        proc = subprocess.run(
+            cmd,
+            cwd=REPO,
+            env=env,
+            stdout=None if verbose else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        process_time = time.perf_counter() - start
+        import_report, stderr = parse_importtime(proc.stderr)
+        if verbose and stderr:
+            print(stderr, file=sys.stderr)
+        if not output.exists():
+            return {
+                "status": "error",
+                "error": stderr[-4000:] or f"driver exited with {proc.returncode}",
+                "runs": [],
+            }
+        result = json.loads(output.read_text())
+    result["process_wall_time"] = round(process_time, 6)
+    result["import_time_ms"] = import_report
+    return result
+
+
+def run(args):
+    scripts = entry_points(args.only)
+    results = {}
+    eager = {}
+    for script in scripts:
+        print(f"{script} ...", end=" ", flush=True)
+        result = run_entry_point(
+            script, args.reruns, args.mode, args.cache_dir, args.verbose
+        )
+        results[script] = result
+        if result["status"] == "ok":
+            cold = result["runs"][0]
+            if cold["eager_imports"]:
+                eager[script] = cold["eager_imports"]
+            paint = cold["first_paint"]
+            print(
+                f"cold {cold['wall_time']:.2f}s, "
+                + ("" if paint is None else f"first paint {paint:.2f}s, ")
+                + ", ".join(f"{k} {v:.2f}s" for k, v in cold["phases"].items())
+                + f", peak RSS {result['runs'][-1]['peak_rss_mb']:.0f} MB"
+            )
+        else:
+            print("error")
+            error = result.get("error") or result["runs"][-1].get("error", "")
+            print("    " + error.strip().splitlines()[-1] if error else "")
+
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "mode": args.mode,
+        "reruns": args.reruns,
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    for script, modules in eager.items():
+        print(f"{script} imports {', '.join(modules)} before its first element")
+    if eager:
+        sys.exit(1)
+
+
+def compare(args):
+    """Print metric changes between two result files, flagging regressions"""
+    base = json.loads(args.base.read_text())
+    new = json.loads(args.new.read_text())
+    print(f"{base['commit']} -> {new['commit']}")
+    regressions = 0
+    for script, new_result in new["results"].items():
+        base_result = base["results"].get(script)
+        if base_result is None:
+            continue
+        if new_result["status"] != "ok" or base_result["status"] != "ok":
+            print(f"{script}: {base_result['status']} -> {new_result['status']}")
+            continue
+        print(script)
+        for name, metric in METRICS.items():
+            try:
+                before, after = metric(base_result), metric(new_result)
+            except (KeyError, ValueError):  # e.g. no reruns recorded
+                continue
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            flag = ""
+            if change > args.threshold and after - before > args.min_delta:
+                flag = "  <-- regression"
+                regressions += 1
+            print(
+                f"    {name:<10} {before:>10.3f} {after:>10.3f} {change:>+8.1%}{flag}"
+            )
+    if regressions:
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard scripts")
+    subparsers = parser.add_subparsers(dest="command")
+
+    cmp = subparsers.add_parser("compare", help="compare two result files")
+    cmp.add_argument("base", type=Path)
+    cmp.add_argument("new", type=Path)
+    cmp.add_argument(
+        "--threshold", type=float, default=0.1, help="relative slowdown to flag"
+    )
+    cmp.add_argument(
+        "--min-delta",
+        type=float,
+        default=0.05,
+        help="ignore absolute changes smaller than this (seconds or MB)",
+    )
+
+    parser.add_argument(
+        "--only", nargs="+", help="scripts to run, e.g. near/finance.py"
+    )
+    parser.add_argument("--reruns", type=int, default=1)
+    parser.add_argument(
+        "--mode",
+        choices=["replay", "live", "record"],
+        default="replay",
+        help="HTTP mode passed to FLIPSIDE_HTTP_MODE",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="reuse a query cache directory instead of starting from an empty one",
+    )
+    parser.add_argument("--output", type=Path)
+    parser.add_argument("-v", "--verbose", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        compare(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+"""Helpers shared by the dashboards in every blockchain directory."""
+
+from common.http_fixtures import install_from_env
+
+install_from_env()
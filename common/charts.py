@@ -0,0 +1,53 @@
+"""Helpers for multi-series Altair charts with a hover tooltip on every date.
+
+Multi-line charts show the values of all series at the hovered date with a
+rule layer, which needs one row per date and one column per series. Rather
+than sending the long table and pivoting it in the browser with
+``transform_pivot``, the chart helpers pivot it once with :func:`pivot_wide`
+and give that table to every layer. The line layers unpivot it with
+``transform_fold``, a cheap per-row operation, and since all layers share one
+DataFrame, Altair embeds it once as a single named dataset.
+
+Series names become field names of the wide table, and Vega-Lite reads ``.``
+and ``[`` in a field as nested access, so a series like ``USDC.e`` would fold
+to nothing. Pass series names through :func:`escape_field` wherever they are
+used as fields (``transform_fold``, tooltips), keeping the raw name as the
+tooltip title; the folded keys come out unescaped.
+"""
+
+import re
+from typing import Iterable, List, Tuple, Union
+
+import pandas as pd
+
+__all__ = ["escape_field", "pivot_wide"]
+
+_FIELD_SPECIAL = re.compile(r"([\\.\[\]])")
+
+
+def escape_field(name) -> str:
+    """``name`` as a Vega-Lite field name, with ``\\``, ``.``, ``[`` and ``]`` escaped"""
+    return _FIELD_SPECIAL.sub(r"\\\1", str(name))
+
+
+def pivot_wide(
+    df: pd.DataFrame, index: Union[str, Iterable[str]], columns: str, values: str
+) -> Tuple[pd.DataFrame, List[str]]:
+    """Pivot ``df`` to one ``values`` column per value of ``columns``
+
+    Like Vega-Lite's pivot transform, duplicate rows are summed, and series
+    missing at some ``index`` are left null.
+
+    Returns
+    -------
+    Tuple[pd.DataFrame, List[str]]
+        The wide table, with the ``index`` columns first, and the names of the series columns
+    """
+    index = [index] if isinstance(index, str) else list(index)
+    wide = (
+        df.groupby(index + [columns], observed=True)[values]
+        .sum(min_count=1)
+        .unstack(columns)
+    )
+    wide.columns = [str(x) for x in wide.columns]
+    return wide.reset_index(), list(wide.columns)
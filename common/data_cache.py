@@ -0,0 +1,541 @@
+"""On-disk cache for Flipside query results.
+
+Every dashboard loads its Flipside queries through :func:`read_query`, which
+stores each result as a Feather file next to a small JSON sidecar holding the
+URL, fetch time and TTL. A fresh process can then load a result from local disk
+instead of downloading and parsing the JSON payload again.
+
+:func:`read_queries` loads several queries at once on a bounded thread pool, so
+a dashboard's cold start costs about as much as its slowest query.
+
+Expired results are served stale while a background thread downloads the new
+version, and every query read through :func:`read_query` is registered with
+:data:`scheduler`, which refreshes it before its TTL runs out. Page views
+therefore only wait on the network the first time a query is ever loaded.
+
+The cache directory defaults to ``~/.cache/flipside_bounties`` and can be moved
+with the ``FLIPSIDE_CACHE_DIR`` environment variable. It is shared by every
+dashboard process on the host: downloads take a per-entry file lock, so when
+several processes miss on the same query only one of them fetches it and the
+rest read its result. Feather files are written uncompressed and memory-mapped
+on read. Frames are returned writable by default, whether they were just
+downloaded or read from disk. Pass ``zero_copy=True`` to :func:`read_query` or
+:func:`read_frame` to keep numeric columns backed by the shared page cache
+instead of a private copy in each process; those columns are read-only.
+
+Every frame returned by :func:`read_query` carries a fingerprint of its cache
+entry in ``df.attrs``. Pass :data:`FINGERPRINT_HASH_FUNCS` as ``hash_funcs`` to
+``st.cache`` so cached transforms key on those fingerprints, plus a hash of
+their fixed-width columns, instead of hashing every cell of their DataFrame
+arguments.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import requests
+from pyarrow import feather
+
+from common.schemas import apply_schema
+
+try:
+    import fcntl
+except ImportError:  # Windows: entries are not locked between processes
+    fcntl = None
+
+__all__ = [
+    "CACHE_DIR",
+    "DEFAULT_TTL",
+    "flipside_url",
+    "cache_key",
+    "read_query",
+    "refresh_query",
+    "read_queries",
+    "QueryLoadError",
+    "entry_lock",
+    "read_frame",
+    "write_frame",
+    "fingerprint",
+    "set_fingerprint",
+    "FINGERPRINT_HASH_FUNCS",
+    "RefreshScheduler",
+    "scheduler",
+]
+
+CACHE_DIR = Path(
+    os.environ.get("FLIPSIDE_CACHE_DIR", Path.home() / ".cache" / "flipside_bounties")
+)
+DEFAULT_TTL = 3600 * 12
+MAX_WORKERS = 8
+# Fraction of a query's TTL after which the scheduler refreshes it
+REFRESH_AT = 0.8
+# Key in ``DataFrame.attrs`` holding the version token of a frame
+FINGERPRINT_ATTR = "fingerprint"
+
+logger = logging.getLogger(__name__)
+
+_query_id_pattern = re.compile(r"/queries/([0-9a-fA-F-]{36})/")
+
+
+def flipside_url(query_id: str) -> str:
+    """URL for the latest results of a Flipside query"""
+    return f"https://api.flipsidecrypto.com/api/v2/queries/{query_id}/data/latest"
+
+
+def cache_key(url: str, read_kwargs: Optional[dict] = None) -> str:
+    """Name of the cache entry for a URL and its ``pd.read_json`` arguments.
+
+    Flipside URLs are keyed by query id, so the same query requested from
+    ``api.`` and ``node-api.`` shares one entry. Other URLs are keyed by a
+    hash. Non-default ``read_kwargs`` change the parsed frame, so they are
+    folded into the key as well.
+    """
+    match = _query_id_pattern.search(url)
+    if match:
+        key = match.group(1).lower()
+    else:
+        key = hashlib.sha1(url.encode()).hexdigest()[:16]
+    if read_kwargs:
+        options = json.dumps(read_kwargs, sort_keys=True, default=str)
+        key = f"{key}-{hashlib.sha1(options.encode()).hexdigest()[:8]}"
+    return key
+
+
+def _paths(key: str) -> Tuple[Path, Path, Path]:
+    return (
+        CACHE_DIR / f"{key}.feather",
+        CACHE_DIR / f"{key}.pkl",
+        CACHE_DIR / f"{key}.json",
+    )
+
+
+@contextmanager
+def entry_lock(key: str, blocking: bool = True):
+    """Exclusive lock on a cache entry, held across processes.
+
+    Yields whether the lock was acquired, which is always True when blocking.
+    """
+    if fcntl is None:
+        yield True
+        return
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(CACHE_DIR / f"{key}.lock", "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _age(meta: dict) -> float:
+    return time.time() - meta["fetched_at"]
+
+
+def _read_meta(key: str) -> Optional[dict]:
+    try:
+        return json.loads(_paths(key)[2].read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_only(df: pd.DataFrame) -> bool:
+    for i in range(df.shape[1]):
+        flags = getattr(df.iloc[:, i].values, "flags", None)
+        if flags is not None and not flags.writeable:
+            return True
+    return False
+
+
+def _read_entry(
+    key: str, zero_copy: bool = False
+) -> Optional[Tuple[pd.DataFrame, dict]]:
+    feather_path, pickle_path, _ = _paths(key)
+    meta = _read_meta(key)
+    if meta is None:
+        return None
+    try:
+        if meta["format"] == "feather":
+            table = feather.read_table(feather_path, memory_map=True)
+            if zero_copy:
+                df = table.to_pandas(split_blocks=True)
+            else:
+                df = table.to_pandas()
+                # Arrow can still hand out views of the mapped file, such as
+                # for single-column tables
+                if _read_only(df):
+                    df = df.copy()
+        else:
+            with open(pickle_path, "rb") as f:
+                df = pickle.load(f)
+    except (OSError, ValueError, KeyError, pickle.UnpicklingError):
+        return None
+    return df, meta
+
+
+def _atomic_write(path: Path, write) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _write_entry(key: str, url: str, df: pd.DataFrame, ttl: float, **extra) -> dict:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    feather_path, pickle_path, meta_path = _paths(key)
+    df = df.reset_index(drop=True)
+    try:
+        _atomic_write(
+            feather_path,
+            lambda p: feather.write_feather(df, p, compression="uncompressed"),
+        )
+        fmt = "feather"
+    except (ValueError, TypeError, NotImplementedError, ImportError):
+        # Columns holding nested JSON objects can't be stored as Arrow
+        def dump(p):
+            with open(p, "wb") as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        _atomic_write(pickle_path, dump)
+        fmt = "pickle"
+    meta = {
+        "url": url,
+        "format": fmt,
+        "fetched_at": time.time(),
+        "ttl": ttl,
+        "rows": len(df),
+        **extra,
+    }
+    _atomic_write(meta_path, lambda p: p.write_text(json.dumps(meta)))
+    return meta
+
+
+def set_fingerprint(df: pd.DataFrame, token: str) -> pd.DataFrame:
+    """Tag ``df`` with a version token identifying its source data"""
+    df.attrs[FINGERPRINT_ATTR] = token
+    return df
+
+
+def _fixed_width_digest(df: pd.DataFrame) -> str:
+    # Raw bytes of the numeric, boolean and datetime columns, hashed without
+    # per-row work
+    h = hashlib.blake2b(digest_size=16)
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i].values
+        if isinstance(values, pd.Categorical):
+            values = values.codes
+        if isinstance(values, np.ndarray) and values.dtype.kind in "biufcmM":
+            h.update(np.ascontiguousarray(values).view(np.uint8))
+    return h.hexdigest()
+
+
+def fingerprint(df: pd.DataFrame) -> tuple:
+    """Cheap identity of a DataFrame, for use as a cache key
+
+    Frames tagged with :func:`set_fingerprint` (as every frame loaded by
+    :func:`read_query` is) are identified by their token, shape, columns,
+    first and last index labels and a hash of the raw bytes of their numeric,
+    boolean, datetime and categorical columns. ``attrs`` are kept by pandas
+    operations such as ``copy``, joins and filtering, so the token alone does
+    not tell a derived frame with new values apart from its source. Untagged
+    frames fall back to hashing their full contents.
+    """
+    token = df.attrs.get(FINGERPRINT_ATTR)
+    if token is None:
+        try:
+            values = pd.util.hash_pandas_object(df, index=True).values
+            token = hashlib.sha1(values.tobytes()).hexdigest()
+        except TypeError:  # unhashable cells, such as nested JSON
+            token = hashlib.sha1(df.to_json().encode()).hexdigest()
+        content = None
+    else:
+        content = _fixed_width_digest(df)
+    ends = (df.index[0], df.index[-1]) if len(df) else ()
+    return (token, df.shape, tuple(df.columns), ends, content)
+
+
+# ``hash_funcs`` for ``st.cache`` keying DataFrame arguments on their fingerprint
+FINGERPRINT_HASH_FUNCS = {pd.DataFrame: fingerprint}
+
+
+def _tagged(df: pd.DataFrame, key: str, meta: dict) -> pd.DataFrame:
+    return set_fingerprint(df, f"{key}@{meta['fetched_at']:.6f}")
+
+
+def _fetch(url: str, read_kwargs: dict) -> pd.DataFrame:
+    read_kwargs = dict(read_kwargs)
+    schema = read_kwargs.pop("schema", None)
+    r = requests.get(url)
+    r.raise_for_status()
+    df = pd.read_json(io.StringIO(r.text), **read_kwargs)
+    if schema:
+        df = apply_schema(df, schema)
+    return df
+
+
+def refresh_query(url: str, ttl: float = DEFAULT_TTL, **read_kwargs) -> pd.DataFrame:
+    """Download a query result and replace its cache entry"""
+    key = cache_key(url, read_kwargs)
+    with entry_lock(key):
+        df = _fetch(url, read_kwargs)
+        meta = _write_entry(key, url, df, ttl)
+    return _tagged(df, key, meta)
+
+
+_inflight = set()
+_inflight_lock = threading.Lock()
+
+
+def _refresh_in_background(
+    url: str, ttl: float, read_kwargs: dict, min_age: float
+) -> None:
+    key = cache_key(url, read_kwargs)
+    with _inflight_lock:
+        if key in _inflight:
+            return
+        _inflight.add(key)
+
+    def run():
+        try:
+            # Skip the download if another process holds the lock, or
+            # refreshed the entry since this one was scheduled
+            with entry_lock(key, blocking=False) as acquired:
+                meta = _read_meta(key)
+                if acquired and (meta is None or _age(meta) >= min_age):
+                    _write_entry(key, url, _fetch(url, read_kwargs), ttl)
+        except Exception:
+            logger.exception("Background refresh of %s failed", url)
+        finally:
+            with _inflight_lock:
+                _inflight.discard(key)
+
+    threading.Thread(target=run, name=f"refresh-{key}", daemon=True).start()
+
+
+def read_query(
+    url: str,
+    ttl: float = DEFAULT_TTL,
+    stale_while_revalidate: bool = True,
+    schedule: bool = True,
+    zero_copy: bool = False,
+    **read_kwargs,
+) -> pd.DataFrame:
+    """Load a Flipside query result, using the on-disk cache when possible
+
+    Parameters
+    ----------
+    url : str
+        API URL of the query results (``.../data/latest``)
+    ttl : float, optional
+        Maximum age of a cached result in seconds, by default DEFAULT_TTL
+    stale_while_revalidate : bool, optional
+        Return an expired result immediately and refresh it in the background,
+        by default True
+    schedule : bool, optional
+        Register the query with :data:`scheduler` so it is refreshed before it
+        expires, by default True
+    zero_copy : bool, optional
+        Leave numeric columns of a cached result memory-mapped, and therefore
+        read-only, instead of copying them, by default False. A result that
+        was just downloaded is always writable.
+    **read_kwargs
+        Passed to ``pd.read_json`` when the result is downloaded. A ``schema``
+        keyword is applied to the parsed frame with
+        :func:`common.schemas.apply_schema` before it is cached.
+
+    Returns
+    -------
+    pd.DataFrame
+        Query results
+    """
+    key = cache_key(url, read_kwargs)
+    if schedule:
+        scheduler.add(url, ttl, **read_kwargs)
+    entry = _read_entry(key, zero_copy)
+    if entry is not None:
+        df, meta = entry
+        if _age(meta) < ttl:
+            return _tagged(df, key, meta)
+        if stale_while_revalidate:
+            _refresh_in_background(url, ttl, read_kwargs, min_age=ttl)
+            return _tagged(df, key, meta)
+
+    with entry_lock(key):
+        # Another process may have downloaded the result while this one waited
+        entry = _read_entry(key, zero_copy)
+        if entry is not None and _age(entry[1]) < ttl:
+            return _tagged(entry[0], key, entry[1])
+        df = _fetch(url, read_kwargs)
+        meta = _write_entry(key, url, df, ttl)
+    return _tagged(df, key, meta)
+
+
+def read_frame(
+    name: str, zero_copy: bool = False
+) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """Read a frame stored with :func:`write_frame`, with its metadata
+
+    With ``zero_copy``, numeric columns stay memory-mapped and are read-only.
+    """
+    entry = _read_entry(name, zero_copy)
+    if entry is None:
+        return None
+    return _tagged(entry[0], name, entry[1]), entry[1]
+
+
+def write_frame(name: str, df: pd.DataFrame, ttl: float = DEFAULT_TTL, **meta) -> dict:
+    """Store a frame built locally (not downloaded) in the cache directory
+
+    The index is dropped, so keep anything needed in a column. ``meta`` must
+    be JSON serializable and is returned by :func:`read_frame`. Hold
+    :func:`entry_lock` on ``name`` around a read-modify-write cycle.
+    """
+    return _write_entry(name, f"local:{name}", df, ttl, **meta)
+
+
+class QueryLoadError(Exception):
+    """One or more queries passed to :func:`read_queries` failed to load.
+
+    ``errors`` maps each failed name to its exception, and ``results`` holds
+    the frames that did load.
+    """
+
+    def __init__(
+        self, errors: Mapping[str, Exception], results: Mapping[str, pd.DataFrame]
+    ):
+        self.errors = dict(errors)
+        self.results = dict(results)
+        details = "; ".join(f"{k}: {e!r}" for k, e in self.errors.items())
+        super().__init__(f"{len(self.errors)} queries failed to load ({details})")
+
+
+def read_queries(
+    urls: Mapping[str, str],
+    ttl: float = DEFAULT_TTL,
+    max_workers: int = MAX_WORKERS,
+    schemas: Optional[Mapping[str, Mapping[str, str]]] = None,
+    **read_kwargs,
+) -> Dict[str, pd.DataFrame]:
+    """Load several query results concurrently with :func:`read_query`
+
+    Parameters
+    ----------
+    urls : Mapping[str, str]
+        Names mapped to API URLs of query results
+    ttl : float, optional
+        Maximum age of a cached result in seconds, by default DEFAULT_TTL
+    max_workers : int, optional
+        Maximum number of simultaneous downloads, by default MAX_WORKERS
+    schemas : Mapping[str, Mapping[str, str]], optional
+        Schema for each name in ``urls`` that has one, see :mod:`common.schemas`
+    **read_kwargs
+        Passed to :func:`read_query`, such as ``zero_copy``, and otherwise to
+        ``pd.read_json`` when a result is downloaded
+
+    Returns
+    -------
+    Dict[str, pd.DataFrame]
+        Query results, in the same order as ``urls``
+
+    Raises
+    ------
+    QueryLoadError
+        If any query fails, after all of the others have finished
+    """
+    schemas = schemas or {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as pool:
+        futures = {}
+        for k, url in urls.items():
+            kwargs = dict(read_kwargs)
+            if k in schemas:
+                kwargs["schema"] = schemas[k]
+            futures[k] = pool.submit(read_query, url, ttl=ttl, **kwargs)
+    results, errors = {}, {}
+    for k, future in futures.items():
+        try:
+            results[k] = future.result()
+        except Exception as e:
+            errors[k] = e
+    if errors:
+        raise QueryLoadError(errors, results)
+    return results
+
+
+class RefreshScheduler:
+    """Refresh registered queries in the background before they expire
+
+    A daemon thread wakes every ``poll_interval`` seconds and refreshes each
+    query whose cached result is older than ``refresh_at`` of that query's own
+    TTL, so every query keeps its own cadence. The thread starts with the first
+    call to :meth:`add`.
+    """
+
+    def __init__(self, poll_interval: float = 30, refresh_at: float = REFRESH_AT):
+        self.poll_interval = poll_interval
+        self.refresh_at = refresh_at
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, url: str, ttl: float = DEFAULT_TTL, **read_kwargs) -> None:
+        """Keep a query refreshed every ``refresh_at * ttl`` seconds"""
+        with self._lock:
+            self._jobs[cache_key(url, read_kwargs)] = (url, ttl, read_kwargs)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="flipside-refresh", daemon=True
+                )
+                self._thread.start()
+
+    def remove(self, url: str, **read_kwargs) -> None:
+        with self._lock:
+            self._jobs.pop(cache_key(url, read_kwargs), None)
+
+    def due(self) -> list:
+        """Registered jobs whose cached result should be refreshed now"""
+        with self._lock:
+            jobs = list(self._jobs.items())
+        due = []
+        for key, job in jobs:
+            meta = _read_meta(key)
+            if meta is None or _age(meta) >= self.refresh_at * job[1]:
+                due.append(job)
+        return due
+
+    def run_pending(self) -> None:
+        for url, ttl, read_kwargs in self.due():
+            _refresh_in_background(url, ttl, read_kwargs, self.refresh_at * ttl)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.run_pending()
+            except Exception:
+                logger.exception("Scheduled refresh failed")
+
+
+scheduler = RefreshScheduler()
@@ -0,0 +1,166 @@
+"""Downsampling of daily time series before they are embedded in a chart.
+
+Altair charts embed their data in the Vega-Lite spec sent to the browser on
+every rerun, so a two year daily history for many tokens makes for a large
+payload. Series longer than ``max_points`` (:data:`MAX_POINTS` by default) are
+reduced before charting, and shorter ones, such as the 7 to 90 day ranges the
+dashboards offer, are left untouched:
+
+- :func:`downsample_line` keeps the points picked by largest-triangle-three-
+  buckets (LTTB), which preserves the visual shape of a line, peaks included.
+- :func:`downsample_area` averages (or sums) the values over buckets of whole
+  days, which suits filled areas where the integral matters more than spikes.
+
+Given a ``by`` column, both keep the same dates for every series, so that the
+wide table built from them for a chart's hover rule (see :mod:`common.charts`)
+has a value for each series at each date. Pass ``max_points=None`` to disable
+them.
+"""
+
+import math
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["MAX_POINTS", "lttb", "downsample_line", "downsample_area"]
+
+MAX_POINTS = 300
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Positions of the ``n`` points of ``(x, y)`` picked by largest-triangle-three-buckets
+
+    ``x`` must be sorted. The first and last points are always kept, and one
+    point is kept from each of ``n - 2`` buckets in between: the one forming
+    the largest triangle with the previously kept point and the average of the
+    next bucket.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket i spans [edges[i], edges[i + 1]), excluding the first and last points
+    edges = (np.arange(n - 1) * (size - 2) / (n - 2)).astype(int) + 1
+    edges[-1] = size - 1
+    kept = np.empty(n, dtype=int)
+    kept[0], kept[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else size
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
+
+
+def _per_series(df: pd.DataFrame, by: Optional[str], reduce) -> pd.DataFrame:
+    if by is None:
+        return reduce(df)
+    parts = [reduce(group) for _, group in df.groupby(by, sort=False, observed=True)]
+    return pd.concat(parts, ignore_index=True) if parts else df
+
+
+def downsample_line(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    by: Optional[str] = None,
+    max_points: Optional[int] = MAX_POINTS,
+) -> pd.DataFrame:
+    """Rows of ``df`` picked by :func:`lttb`, at most ``max_points`` per series
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data with a datetime ``x`` and numeric ``y`` column
+    x : str
+        Date column
+    y : str
+        Value column
+    by : str, optional
+        Column identifying each series (the chart's color), by default None
+    max_points : int, optional
+        Points to keep per series, by default MAX_POINTS. None keeps all points
+
+    Returns
+    -------
+    pd.DataFrame
+        Kept rows, with all columns of ``df``, sorted by ``x``. With ``by``,
+        every series keeps the same dates, at most ``max_points`` of them
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+
+    df = df.dropna(subset=[x, y]).sort_values(by=x, kind="stable")
+    dates = pd.DatetimeIndex(pd.to_datetime(df[x]))
+    values = pd.to_numeric(df[y])
+    if by is None:
+        return df.iloc[lttb(dates.asi8, values.to_numpy(), max_points)]
+
+    # Pick the dates on the sum of the series, each scaled to [0, 1] so that
+    # small series shape the pick as much as large ones, and keep those dates
+    # in every series
+    wide = values.groupby([dates, df[by].to_numpy()]).sum().unstack()
+    low, high = wide.min(), wide.max()
+    shape = ((wide - low) / (high - low).where(high > low, 1)).sum(axis=1)
+    kept = shape.index[lttb(shape.index.asi8, shape.to_numpy(), max_points)]
+    return df[dates.isin(kept)]
+
+
+def downsample_area(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    by: Optional[str] = None,
+    max_points: Optional[int] = MAX_POINTS,
+    agg: str = "mean",
+) -> pd.DataFrame:
+    """``y`` aggregated over buckets of whole days, at most ``max_points`` per series
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data with a datetime ``x`` and numeric ``y`` column
+    x : str
+        Date column
+    y : str
+        Value column
+    by : str, optional
+        Column identifying each series, by default None
+    max_points : int, optional
+        Maximum number of buckets per series, by default MAX_POINTS. None keeps all points
+    agg : str, optional
+        Aggregation of the values in each bucket, by default "mean"
+
+    Returns
+    -------
+    pd.DataFrame
+        ``x`` (start of each bucket), ``by`` and ``y`` columns
+    """
+    if max_points is None or len(df) <= max_points:
+        return df
+
+    # Buckets are laid out over the full range, so every series shares them
+    all_dates = pd.DatetimeIndex(pd.to_datetime(df[x]))
+    span = (all_dates.max() - all_dates.min()) / pd.Timedelta(days=1) + 1
+    days = max(1, math.ceil(span / max_points))
+    origin = all_dates.min().normalize()
+
+    def reduce(series: pd.DataFrame) -> pd.DataFrame:
+        dates = pd.DatetimeIndex(pd.to_datetime(series[x]))
+        values = pd.Series(pd.to_numeric(series[y]).to_numpy(), index=dates)
+        reduced = values.resample(f"{days}D", origin=origin).agg(agg).dropna()
+        reduced = reduced.rename_axis(x).rename(y).reset_index()
+        if by is not None:
+            reduced.insert(1, by, series[by].iloc[0])
+        return reduced
+
+    return _per_series(df, by, reduce)
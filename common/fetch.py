@@ -0,0 +1,267 @@
+"""Pooled, concurrent fetching of JSON APIs with a TTL per endpoint.
+
+:func:`session` returns a process-wide ``requests.Session`` with keep-alive
+connection pools sized for :data:`MAX_WORKERS` concurrent requests, so repeated
+calls to the same host reuse their TCP/TLS connections.
+
+A :class:`FetchPlan` is a table of named :class:`Endpoint` objects, each with
+its own TTL. :meth:`FetchPlan.fetch` returns the requested subset of
+endpoints, downloading only the ones that are missing or expired, in
+parallel. Results are kept in memory and shared by every session of the
+process, and concurrent callers missing on the same endpoint wait for a single
+download instead of each making their own. Endpoints can be added to a plan
+once they are known with :meth:`FetchPlan.add`, fetched ahead of time on a
+background thread with :meth:`FetchPlan.prefetch`, and dropped again with
+:meth:`FetchPlan.evict` once nobody has read them for a while.
+
+Endpoints that every session reads, with a short TTL, can instead be kept
+fresh by :meth:`FetchPlan.poll`: a background thread downloads each of them
+once per TTL, and :meth:`FetchPlan.fetch` serves their last good value
+without downloading, so the load on the API doesn't depend on the number of
+sessions.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Mapping, NamedTuple, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+__all__ = [
+    "MAX_WORKERS",
+    "TIMEOUT",
+    "session",
+    "Endpoint",
+    "FetchPlan",
+]
+
+MAX_WORKERS = 8
+TIMEOUT = 30
+
+logger = logging.getLogger(__name__)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def session() -> requests.Session:
+    """Shared keep-alive session, retrying transient server errors"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=2,
+                backoff_factor=0.5,
+                status_forcelist=(429, 502, 503, 504),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=MAX_WORKERS,
+                pool_maxsize=MAX_WORKERS,
+                max_retries=retry,
+            )
+            s = requests.Session()
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+    return _session
+
+
+class Endpoint(NamedTuple):
+    """A URL to fetch and how long its response stays fresh, in seconds"""
+
+    url: str
+    ttl: float
+    params: Optional[Mapping[str, Any]] = None
+
+
+def _json(name: str, r: requests.Response) -> Any:
+    return r.json()
+
+
+class FetchPlan:
+    """Named endpoints fetched concurrently and cached per endpoint TTL
+
+    Parameters
+    ----------
+    endpoints : Mapping[str, Endpoint]
+        Endpoints by name
+    parse : Callable[[str, requests.Response], Any], optional
+        Turns a response into the value stored for an endpoint, by default its JSON
+    max_workers : int, optional
+        Maximum number of simultaneous downloads, by default MAX_WORKERS
+    """
+
+    def __init__(
+        self,
+        endpoints: Mapping[str, Endpoint],
+        parse: Callable[[str, requests.Response], Any] = _json,
+        max_workers: int = MAX_WORKERS,
+    ):
+        self.endpoints = dict(endpoints)
+        self.parse = parse
+        self.max_workers = max_workers
+        self._results = {}
+        self._locks = {name: threading.Lock() for name in self.endpoints}
+        self._lock = threading.Lock()
+        self._prefetching = None
+        self._polled: Dict[str, float] = {}
+        self._polling = None
+        self._read: Dict[str, float] = {}
+
+    def add(self, endpoints: Mapping[str, Endpoint]) -> None:
+        """Add endpoints to the plan, keeping the results of the existing ones"""
+        with self._lock:
+            for name, endpoint in endpoints.items():
+                self._locks.setdefault(name, threading.Lock())
+                # Counts as a read, so it isn't evicted before its first fetch
+                self._read[name] = time.time()
+                if self.endpoints.get(name) != endpoint:
+                    self._results.pop(name, None)
+                self.endpoints[name] = endpoint
+
+    def _fresh(self, name: str, max_age: Optional[float] = None) -> bool:
+        entry = self._results.get(name)
+        if max_age is None:
+            max_age = self.endpoints[name].ttl
+        return entry is not None and time.time() - entry[0] < max_age
+
+    def _load(self, name: str, max_age: Optional[float] = None) -> None:
+        # Only one thread downloads an endpoint, the others wait for its result
+        with self._locks[name]:
+            if self._fresh(name, max_age):
+                return
+            endpoint = self.endpoints[name]
+            r = session().get(endpoint.url, params=endpoint.params, timeout=TIMEOUT)
+            r.raise_for_status()
+            self._results[name] = (time.time(), self.parse(name, r))
+
+    def fetch(self, names: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+        """Values of the named endpoints (all of them by default), in plan order
+
+        An expired value is returned if its refresh fails, and polled endpoints
+        return their last value without being downloaded. Raises ``KeyError``
+        for names that are not in the plan, and re-raises the first download
+        error for an endpoint with no value after the others have finished.
+        """
+        with self._lock:
+            endpoints = list(self.endpoints)
+        names = endpoints if names is None else list(names)
+        unknown = [x for x in names if x not in endpoints]
+        if unknown:
+            raise KeyError(f"Unknown endpoints: {', '.join(unknown)}")
+        names = [x for x in endpoints if x in names]
+
+        stale = [
+            x
+            for x in names
+            if not self._fresh(x) and not (x in self._polled and x in self._results)
+        ]
+        if stale:
+            workers = max(1, min(self.max_workers, len(stale)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {x: pool.submit(self._load, x) for x in stale}
+            for name, future in futures.items():
+                error = future.exception()
+                if error is None:
+                    continue
+                if name not in self._results:
+                    raise error
+                logger.warning(
+                    "Refreshing %s failed, using the expired value: %r", name, error
+                )
+        now = time.time()
+        for name in names:
+            self._read[name] = now
+        return {x: self._results[x][1] for x in names}
+
+    def evict(self, idle: float) -> list:
+        """Remove endpoints that haven't been added or fetched for ``idle`` seconds
+
+        Polled endpoints and endpoints being downloaded are kept. Returns the
+        names of the removed endpoints.
+        """
+        cutoff = time.time() - idle
+        with self._lock:
+            names = [
+                x
+                for x in self.endpoints
+                if x not in self._polled
+                and self._read.get(x, 0) < cutoff
+                and not self._locks[x].locked()
+            ]
+            for name in names:
+                del self.endpoints[name]
+                self._results.pop(name, None)
+                self._locks.pop(name, None)
+                self._read.pop(name, None)
+        return names
+
+    def prefetch(self, names: Optional[Iterable[str]] = None) -> threading.Thread:
+        """Fetch endpoints (all of them by default) on a background thread
+
+        Failures are logged. While a prefetch is running, the running thread is
+        returned instead of starting another one.
+        """
+        names = None if names is None else list(names)
+
+        def run():
+            try:
+                self.fetch(names)
+            except Exception as e:
+                logger.warning("Prefetching failed: %r", e)
+
+        with self._lock:
+            if self._prefetching is None or not self._prefetching.is_alive():
+                self._prefetching = threading.Thread(target=run, daemon=True)
+                self._prefetching.start()
+            return self._prefetching
+
+    def poll(
+        self, names: Optional[Iterable[str]] = None, interval: Optional[float] = None
+    ) -> threading.Thread:
+        """Keep endpoints (all of them by default) fresh from a background thread
+
+        Each endpoint is downloaded again once its value is ``interval`` seconds
+        old, by default its TTL. A failed download is logged and retried on the
+        next round, and the last good value is served until then. Endpoints
+        can be added to the running poller by calling this again.
+        """
+        with self._lock:
+            names = list(self.endpoints) if names is None else list(names)
+            unknown = [x for x in names if x not in self.endpoints]
+            if unknown:
+                raise KeyError(f"Unknown endpoints: {', '.join(unknown)}")
+            for name in names:
+                self._polled[name] = (
+                    self.endpoints[name].ttl if interval is None else interval
+                )
+            if self._polling is None or not self._polling.is_alive():
+                self._polling = threading.Thread(target=self._poll, daemon=True)
+                self._polling.start()
+            return self._polling
+
+    def _poll(self) -> None:
+        due: Dict[str, float] = {}
+        while True:
+            with self._lock:
+                polled = dict(self._polled)
+            for name, interval in polled.items():
+                if due.get(name, 0) > time.time():
+                    continue
+                try:
+                    self._load(name, max_age=interval)
+                except Exception as e:
+                    logger.warning("Polling %s failed: %r", name, e)
+                now = time.time()
+                last = self._results[name][0] if name in self._results else 0
+                # A failed endpoint is retried after a full interval as well
+                due[name] = last + interval if last + interval > now else now + interval
+            time.sleep(max(1.0, min(due.values(), default=0) - time.time()))
+
+    def clear(self) -> None:
+        """Forget all cached results"""
+        self._results.clear()
@@ -0,0 +1,123 @@
+"""Typed flat tables from JSON records with nested objects.
+
+API payloads often hold a column of objects (``{"date": ..., "usd": ...}``)
+in each record, and numbers and dates as strings. :func:`flatten` turns such a
+frame into a flat table given a spec of the columns to extract: each
+:class:`Field` is a dotted path into the records and a type. The objects of a
+nested column are converted at once to an Arrow struct array and their fields
+extracted with Arrow compute, and types are converted a column at a time, so
+no Python code runs per row.
+"""
+
+import logging
+from typing import Dict, Iterable, Mapping, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+__all__ = ["Field", "flatten"]
+
+logger = logging.getLogger(__name__)
+
+
+class Field(NamedTuple):
+    """Dotted path of a value in each record, and its type
+
+    ``dtype`` is one of "float", "int" (nullable ``Int64``), "datetime", "str",
+    or None to keep the values as they are.
+    """
+
+    path: str
+    dtype: Optional[str] = None
+
+
+def _cast(values: pd.Series, dtype: Optional[str]) -> pd.Series:
+    if dtype is None:
+        return values
+    if dtype == "float":
+        return pd.to_numeric(values, errors="coerce").astype(float)
+    if dtype == "int":
+        return pd.to_numeric(values, errors="coerce").astype("Int64")
+    if dtype == "datetime":
+        return pd.to_datetime(values, errors="coerce")
+    if dtype == "str":
+        return values.where(values.isna(), values.astype(str))
+    raise ValueError(f"Unknown field type: {dtype!r}")
+
+
+def _nested(values: pd.Series, paths: Iterable[str]) -> Dict[str, pd.Series]:
+    """Values at each dotted ``path`` of the objects in ``values``"""
+    paths = list(paths)
+    try:
+        objects = pa.array(values.to_numpy(dtype=object), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        objects = None
+    if objects is None or not pa.types.is_struct(objects.type):
+        # Fields of mixed types, let pandas sort them out
+        flat = pd.json_normalize(
+            [x if isinstance(x, dict) else {} for x in values.to_numpy(dtype=object)]
+        )
+        flat.index = values.index
+        return {
+            p: flat[p] if p in flat else pd.Series(np.nan, index=values.index)
+            for p in paths
+        }
+
+    out = {}
+    for path in paths:
+        column, indices = objects, []
+        for name in path.split("."):
+            if (
+                not pa.types.is_struct(column.type)
+                or column.type.get_field_index(name) < 0
+            ):
+                column = None
+                break
+            indices.append(column.type.get_field_index(name))
+            column = pc.struct_field(objects, indices)
+        if column is None:
+            logger.warning("No field %r in the records", path)
+            out[path] = pd.Series(np.nan, index=values.index)
+        else:
+            out[path] = pd.Series(
+                column.to_numpy(zero_copy_only=False), index=values.index
+            )
+    return out
+
+
+def flatten(df: pd.DataFrame, fields: Mapping[str, Field]) -> pd.DataFrame:
+    """Flat table of ``fields`` extracted from the records of ``df``
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Records, possibly with columns of nested objects
+    fields : Mapping[str, Field]
+        Output column -> field. A path without dots is a column of ``df``, and
+        ``"col.a.b"`` is the value at ``["a"]["b"]`` of the objects in ``col``
+
+    Returns
+    -------
+    pd.DataFrame
+        The fields, typed, followed by the columns of ``df`` that are not
+        nested columns used by a field
+    """
+    nested: Dict[str, list] = {}
+    for field in fields.values():
+        column, _, rest = field.path.partition(".")
+        if rest:
+            nested.setdefault(column, []).append(rest)
+
+    values = {}
+    for column, paths in nested.items():
+        for path, series in _nested(df[column], paths).items():
+            values[f"{column}.{path}"] = series
+
+    out = pd.DataFrame(index=df.index)
+    for name, field in fields.items():
+        series = values[field.path] if field.path in values else df[field.path]
+        out[name] = _cast(series, field.dtype)
+    rest = [c for c in df.columns if c not in nested and c not in out]
+    return pd.concat([out, df[rest]], axis=1)
@@ -0,0 +1,205 @@
+"""Record and replay outbound HTTP traffic, for running dashboards offline.
+
+The mode is chosen with the ``FLIPSIDE_HTTP_MODE`` environment variable:
+
+- ``record``: every response is saved into the cassette directory
+- ``replay``: requests are answered from the cassette directory by a stand-in
+  HTTP server on localhost, and nothing leaves the machine
+- unset or ``live``: requests go out as usual
+
+The cassette directory defaults to ``cassettes/`` at the top of the repo and can
+be moved with ``FLIPSIDE_CASSETTE_DIR``. Traffic is intercepted at
+``requests.adapters.HTTPAdapter.send``, which covers ``requests.get``, sessions
+and ShroomDK, i.e. every call to Flipside, Ref, Figment, the Terra LCD and
+Paras. The mode is applied when :mod:`common` is imported.
+
+Responses are keyed by method, URL and body. Repeated requests (for example
+ShroomDK polling for query results) are stored in order and replayed in the
+same order, with the last response repeated once the recording runs out.
+API keys embedded in Figment URLs are redacted before hashing or saving.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__all__ = [
+    "MODE_ENV_VAR",
+    "CASSETTE_DIR_ENV_VAR",
+    "CassetteMissError",
+    "install",
+    "install_from_env",
+    "uninstall",
+]
+
+MODE_ENV_VAR = "FLIPSIDE_HTTP_MODE"
+CASSETTE_DIR_ENV_VAR = "FLIPSIDE_CASSETTE_DIR"
+DEFAULT_CASSETTE_DIR = Path(__file__).resolve().parents[1] / "cassettes"
+
+_secret_pattern = re.compile(r"(apikey/)[^/?]+")
+_original_send = HTTPAdapter.send
+
+
+class CassetteMissError(requests.ConnectionError):
+    """A request made in replay mode has no recorded response"""
+
+
+def redact(url: str) -> str:
+    return _secret_pattern.sub(r"\1REDACTED", url)
+
+
+def request_key(request: requests.PreparedRequest) -> str:
+    h = hashlib.sha1(f"{request.method} {redact(request.url)}".encode())
+    body = request.body
+    if body:
+        h.update(body.encode() if isinstance(body, str) else body)
+    return h.hexdigest()[:20]
+
+
+class Cassette:
+    """Directory of recorded responses, one ``.json`` and ``.body`` per response"""
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _next_index(self, key: str) -> int:
+        with self._lock:
+            n = self._counts[key]
+            self._counts[key] += 1
+        return n
+
+    def save(
+        self, request: requests.PreparedRequest, response: requests.Response
+    ) -> None:
+        key = request_key(request)
+        name = f"{key}-{self._next_index(key)}"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / f"{name}.body").write_bytes(response.content)
+        meta = {
+            "method": request.method,
+            "url": redact(request.url),
+            "status": response.status_code,
+            "content_type": response.headers.get("Content-Type"),
+            "recorded_at": time.time(),
+        }
+        (self.directory / f"{name}.json").write_text(json.dumps(meta, indent=2))
+
+    def find(self, request: requests.PreparedRequest) -> Optional[str]:
+        """Name of the next recorded response for a request, if there is one"""
+        key = request_key(request)
+        for n in range(self._next_index(key), -1, -1):
+            if (self.directory / f"{key}-{n}.json").exists():
+                return f"{key}-{n}"
+        return None
+
+
+def _handler(cassette: Cassette):
+    class Handler(BaseHTTPRequestHandler):
+        def _serve(self):
+            name = self.path.lstrip("/")
+            try:
+                meta = json.loads((cassette.directory / f"{name}.json").read_text())
+                body = (cassette.directory / f"{name}.body").read_bytes()
+            except OSError:
+                self.send_error(404, f"No recorded response {name}")
+                return
+            self.send_response(meta["status"])
+            if meta["content_type"]:
+                self.send_header("Content-Type", meta["content_type"])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _serve
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class ReplayServer:
+    """Stand-in HTTP server on localhost that serves a cassette's responses"""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(cassette))
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="http-replay", daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_installed = None
+
+
+def install(mode: str, directory: Optional[Path] = None) -> None:
+    """Patch requests to record to, or replay from, a cassette directory"""
+    global _installed
+    if mode not in ("record", "replay"):
+        raise ValueError(f"Unknown HTTP mode {mode!r}, expected record or replay")
+    uninstall()
+    cassette = Cassette(directory or DEFAULT_CASSETTE_DIR)
+
+    if mode == "record":
+
+        def send(adapter, request, **kwargs):
+            response = _original_send(adapter, request, **kwargs)
+            cassette.save(request, response)
+            return response
+
+        _installed = (send, None)
+    else:
+        server = ReplayServer(cassette)
+
+        def send(adapter, request, **kwargs):
+            name = cassette.find(request)
+            if name is None:
+                raise CassetteMissError(
+                    f"No recorded response for {request.method} {redact(request.url)}",
+                    request=request,
+                )
+            local = request.copy()
+            local.url = f"{server.url}/{name}"
+            kwargs["proxies"] = {}
+            response = _original_send(adapter, local, **kwargs)
+            response.url = request.url
+            response.request = request
+            return response
+
+        _installed = (send, server)
+    HTTPAdapter.send = send
+
+
+def uninstall() -> None:
+    """Restore live HTTP traffic"""
+    global _installed
+    if _installed is not None and _installed[1] is not None:
+        _installed[1].close()
+    _installed = None
+    HTTPAdapter.send = _original_send
+
+
+def install_from_env() -> None:
+    mode = os.environ.get(MODE_ENV_VAR, "live").lower()
+    if mode != "live":
+        directory = os.environ.get(CASSETTE_DIR_ENV_VAR)
+        install(mode, Path(directory) if directory else None)
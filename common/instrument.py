@@ -0,0 +1,268 @@
+"""Per-rerun timings for data loaders, transforms, charts and page sections.
+
+Wrap functions with :func:`instrument` (or :func:`cached`, which also applies
+``st.cache`` and records whether the call was a cache hit), and page sections
+with :func:`section` or :func:`start_section`. Each call records its wall time,
+the number of DataFrame rows passed in and returned, an estimate of the bytes
+of data embedded in a returned Altair chart, and the cache status.
+
+Call :func:`show_panel` at the end of a dashboard script. It appends the run's
+records to a rotating JSONL log (``instrument.jsonl`` in the query cache
+directory, or ``FLIPSIDE_INSTRUMENT_LOG``; set it empty to disable) and, when
+the page is opened with ``?instrument=1``, shows them in the sidebar.
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Optional
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+
+from common.data_cache import CACHE_DIR
+
+__all__ = [
+    "instrument",
+    "cached",
+    "section",
+    "start_section",
+    "show_panel",
+]
+
+LOG_PATH = os.environ.get(
+    "FLIPSIDE_INSTRUMENT_LOG", str(CACHE_DIR / "instrument.jsonl")
+)
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+QUERY_PARAM = "instrument"
+# Rows serialized to estimate the JSON size of chart data
+SAMPLE_ROWS = 100
+
+# Each Streamlit session runs its script on its own thread
+_state = threading.local()
+_log = logging.getLogger("flipside_bounties.instrument")
+_log_lock = threading.Lock()
+
+
+def _records() -> list:
+    if not hasattr(_state, "records"):
+        _state.records = []
+        _state.stack = []
+        _state.open_section = None
+        _state.started = time.perf_counter()
+    return _state.records
+
+
+def _rows(obj) -> Optional[int]:
+    """Total rows of the DataFrames in ``obj`` (a frame or a mapping of them)"""
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return len(obj)
+    if isinstance(obj, Mapping):
+        counts = [_rows(v) for v in obj.values()]
+        counts = [x for x in counts if x is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def _chart_frames(chart, frames: dict):
+    data = getattr(chart, "data", None)
+    if isinstance(data, pd.DataFrame):
+        frames[id(data)] = data
+    for attr in ("layer", "hconcat", "vconcat", "concat"):
+        subcharts = getattr(chart, attr, None)
+        if isinstance(subcharts, list):
+            for subchart in subcharts:
+                _chart_frames(subchart, frames)
+    spec = getattr(chart, "spec", None)
+    if hasattr(spec, "data"):  # repeat and facet charts
+        _chart_frames(spec, frames)
+    return frames
+
+
+def _json_bytes(df: pd.DataFrame) -> int:
+    """Estimated size of ``df`` serialized to JSON records, as Altair embeds it"""
+    if df.empty:
+        return 0
+    sample = df.head(SAMPLE_ROWS).to_json(
+        orient="records", date_format="iso", default_handler=str
+    )
+    return int(len(sample) / min(len(df), SAMPLE_ROWS) * len(df))
+
+
+def _chart_data(chart):
+    """Rows and estimated bytes of the data embedded in an Altair chart"""
+    frames = _chart_frames(chart, {}).values()
+    return sum(len(df) for df in frames), sum(_json_bytes(df) for df in frames)
+
+
+class _Span:
+    """Times a block and appends its record to the current run"""
+
+    def __init__(self, name: str, kind: str):
+        self.name = name
+        self.kind = kind
+        self.record = None
+
+    def __enter__(self):
+        records = _records()
+        self.record = {
+            "name": self.name,
+            "kind": self.kind,
+            "depth": len(_state.stack),
+            "wall_ms": None,
+            "rows_in": None,
+            "rows_out": None,
+            "chart_bytes": None,
+            "cache": None,
+        }
+        records.append(self.record)
+        _state.stack.append(self.record)
+        self._start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record["wall_ms"] = round((time.perf_counter() - self._start) * 1000, 2)
+        if exc_type is not None:
+            self.record["error"] = exc_type.__name__
+        if _state.stack and _state.stack[-1] is self.record:
+            _state.stack.pop()
+        return False
+
+
+def instrument(kind: str = "transform", name: Optional[str] = None):
+    """Decorator recording each call of a loader, transform or chart builder
+
+    Parameters
+    ----------
+    kind : str, optional
+        Category shown in the panel, such as "load", "transform" or "chart", by default "transform"
+    name : str, optional
+        Name of the record, by default the function's name
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name or func.__name__, kind) as record:
+                rows_in = [_rows(x) for x in (*args, *kwargs.values())]
+                rows_in = [x for x in rows_in if x is not None]
+                record["rows_in"] = sum(rows_in) if rows_in else None
+                result = func(*args, **kwargs)
+                if isinstance(result, alt.TopLevelMixin):
+                    record["rows_out"], record["chart_bytes"] = _chart_data(result)
+                else:
+                    record["rows_out"] = _rows(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def cached(kind: str = "load", name: Optional[str] = None, **cache_kwargs):
+    """``st.cache`` with :func:`instrument`, recording cache hits and misses
+
+    ``cache_kwargs`` are passed on to ``st.cache``.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def run_on_miss(*args, **kwargs):
+            if _state.stack:
+                _state.stack[-1]["cache"] = "miss"
+            return func(*args, **kwargs)
+
+        cached_func = st.cache(**cache_kwargs)(run_on_miss)
+
+        @functools.wraps(func)
+        def mark_hit(*args, **kwargs):
+            if _state.stack:
+                _state.stack[-1]["cache"] = "hit"
+            return cached_func(*args, **kwargs)
+
+        return instrument(kind, name or func.__name__)(mark_hit)
+
+    return decorator
+
+
+def section(name: str) -> _Span:
+    """Context manager timing a section of a dashboard"""
+    return _Span(name, "section")
+
+
+def start_section(name: str):
+    """Close the previous top-level section and start timing a new one
+
+    Useful for scripts laid out as a flat sequence of headers, where wrapping
+    each section in a ``with`` block would mean re-indenting it.
+    """
+    _end_section()
+    _state.open_section = section(name)
+    _state.open_section.__enter__()
+
+
+def _end_section():
+    _records()
+    if _state.open_section is not None:
+        _state.open_section.__exit__(None, None, None)
+        _state.open_section = None
+
+
+def _write_log(run: dict):
+    if not LOG_PATH:
+        return
+    with _log_lock:
+        if not _log.handlers:
+            path = Path(LOG_PATH)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                handler = RotatingFileHandler(
+                    path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS
+                )
+            except OSError:
+                _log.addHandler(logging.NullHandler())
+            else:
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                _log.addHandler(handler)
+            _log.setLevel(logging.INFO)
+            _log.propagate = False
+    _log.info(json.dumps(run, default=str))
+
+
+def show_panel():
+    """Log this run's records and show them in the sidebar if requested"""
+    _end_section()
+    records = _records()
+    run = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "script": Path(sys.argv[0]).name,
+        "wall_ms": round((time.perf_counter() - _state.started) * 1000, 2),
+        "records": records,
+    }
+    del _state.records
+
+    _write_log(run)
+
+    if not st.experimental_get_query_params().get(QUERY_PARAM):
+        return
+    st.sidebar.subheader("Rerun breakdown")
+    st.sidebar.metric("Script run time (ms)", f"{run['wall_ms']:,.0f}")
+    if not records:
+        return
+    df = pd.DataFrame(records)
+    df["name"] = [" " * d + n for d, n in zip(df.depth, df.name)]
+    st.sidebar.dataframe(df.drop(columns="depth"))
+    top = df[df.depth == 0].groupby("kind").wall_ms.sum()
+    st.sidebar.write(
+        ", ".join(f"**{k}**: {v:,.0f} ms" for k, v in top.sort_values().items())
+    )
@@ -0,0 +1,162 @@
+"""Daily time series for many keys, kept as one dates × keys table on disk.
+
+A :class:`DatePanel` holds one float column per key (for example a token's
+price) on a daily ``DatetimeIndex``. Columns are filled by a ``fetch``
+function returning the full history of one key; keys that are missing or
+older than the panel's TTL are fetched concurrently, and a refreshed key only
+adds the dates after its last stored value. The table is stored in the query
+cache directory (see :mod:`common.data_cache`), so it is shared by every
+dashboard process and survives restarts.
+
+:meth:`DatePanel.lookup` returns the values for paired keys and dates as one
+array, replacing a merge on string keys with positional indexing.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+from common.data_cache import (
+    DEFAULT_TTL,
+    MAX_WORKERS,
+    entry_lock,
+    read_frame,
+    write_frame,
+)
+
+__all__ = ["DatePanel", "to_daily"]
+
+logger = logging.getLogger(__name__)
+
+
+def to_daily(values: pd.Series) -> pd.Series:
+    """Last value of each day of a datetime-indexed series, as naive UTC dates"""
+    index = pd.DatetimeIndex(values.index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    values = pd.Series(
+        pd.to_numeric(values.values, errors="coerce"), index=index.normalize()
+    )
+    values = values[values.index.notna()].dropna().sort_index()
+    return values.groupby(level=0).last().astype(float)
+
+
+class DatePanel:
+    """A dates × keys table of floats, filled and refreshed one key at a time
+
+    Parameters
+    ----------
+    name : str
+        Name of the table in the cache directory
+    fetch : Callable[[str], pd.Series]
+        Returns the history of a key, indexed by datetime
+    ttl : float, optional
+        Seconds before a key is fetched again, by default DEFAULT_TTL
+    max_workers : int, optional
+        Maximum number of simultaneous fetches, by default MAX_WORKERS
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fetch: Callable[[str], pd.Series],
+        ttl: float = DEFAULT_TTL,
+        max_workers: int = MAX_WORKERS,
+    ):
+        self.name = name
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._table = pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
+        self._fetched: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _stale(self, keys: Iterable[str]) -> list:
+        now = time.time()
+        return [k for k in keys if now - self._fetched.get(k, 0) >= self.ttl]
+
+    def _load(self) -> None:
+        entry = read_frame(self.name)
+        if entry is None:
+            return
+        df, meta = entry
+        self._table = df.set_index("date")
+        self._fetched = dict(meta.get("fetched", {}))
+
+    def _merge(self, table: pd.DataFrame, key: str, values: pd.Series) -> pd.DataFrame:
+        values = to_daily(values)
+        if key in table and table[key].notna().any():
+            # Keep stored history, only add dates after the last known value
+            values = values[values.index > table[key].last_valid_index()]
+        if values.empty:
+            if key not in table:
+                table[key] = np.nan
+            return table
+        table = table.reindex(table.index.union(values.index))
+        if key not in table:
+            table[key] = np.nan
+        column = table[key].to_numpy(dtype=float, copy=True)
+        column[table.index.get_indexer(values.index)] = values.to_numpy()
+        table[key] = column
+        return table
+
+    def _update(self, keys: list) -> None:
+        with entry_lock(self.name):
+            # Another process may have fetched some of these already
+            self._load()
+            stale = self._stale(keys)
+            if not stale:
+                return
+            workers = max(1, min(self.max_workers, len(stale)))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {k: pool.submit(self.fetch, k) for k in stale}
+            table = self._table.copy()
+            errors = []
+            for key, future in futures.items():
+                try:
+                    values = future.result()
+                except Exception as e:
+                    # Keep serving the stored history of a key that fails to refresh
+                    if key not in table:
+                        errors.append(e)
+                    logger.warning("Fetching %s for %s failed: %r", key, self.name, e)
+                    continue
+                table = self._merge(table, key, values)
+                self._fetched[key] = time.time()
+            table.index.name = "date"
+            self._table = table
+            write_frame(
+                self.name,
+                table.reset_index(),
+                ttl=self.ttl,
+                fetched=self._fetched,
+            )
+        if errors:
+            raise errors[0]
+
+    def frame(self, keys: Iterable[str]) -> pd.DataFrame:
+        """Daily values of ``keys``, one column each, fetching stale keys first"""
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            if self._stale(keys):
+                self._update(keys)
+            return self._table.reindex(columns=keys)
+
+    def lookup(self, keys: Iterable[str], dates: Iterable) -> np.ndarray:
+        """Value for each ``(key, date)`` pair, NaN where there is none"""
+        keys = pd.Index(pd.Series(keys, dtype=object))
+        dates = pd.DatetimeIndex(pd.Series(dates))
+        if dates.tz is not None:
+            dates = dates.tz_convert("UTC").tz_localize(None)
+        table = self.frame(keys.dropna().unique())
+        rows = table.index.get_indexer(dates.normalize())
+        cols = table.columns.get_indexer(keys)
+        found = (rows >= 0) & (cols >= 0)
+        out = np.full(len(keys), np.nan)
+        out[found] = table.to_numpy(dtype=float)[rows[found], cols[found]]
+        return out
@@ -0,0 +1,116 @@
+"""Daily aggregates of growing query results, extended incrementally.
+
+A :class:`DailyRollup` keeps a compact table of per-day (and per-key)
+aggregates of a query result in the query cache directory (see
+:mod:`common.data_cache`). When the query is refreshed, only the rows from the
+last stored day onwards are aggregated: that day is recomputed, as it may
+have been partial, and later days are appended. Days that have dropped out of
+the query's window are kept, and a result that has already been rolled up
+(same fingerprint) is not aggregated again, so reruns cost a dictionary lookup
+whatever the length of the history.
+
+Aggregations are given per output column as ``(column, function)`` pairs, as
+for ``DataFrame.groupby(...).agg``. Since each day is aggregated in full, any
+function can be used. The stored table also records its aggregations and the
+dtypes of the source columns it was built from; if either changes (e.g. a
+query gains a schema), the table is rebuilt from the current source instead of
+being extended.
+"""
+
+import logging
+import threading
+from typing import Iterable, Mapping, Optional, Tuple
+
+import pandas as pd
+
+from common.data_cache import entry_lock, fingerprint, read_frame, write_frame
+
+__all__ = ["DailyRollup"]
+
+logger = logging.getLogger(__name__)
+
+# Rollups are refreshed from their source, so the stored copy never expires
+TTL = 365 * 24 * 3600
+
+
+class DailyRollup:
+    """Per-day aggregates of a table, stored on disk and extended with new days
+
+    Parameters
+    ----------
+    name : str
+        Name of the table in the cache directory
+    date_col : str
+        Column of the source with the date or time of each row
+    keys : Iterable[str]
+        Columns to group by within each day
+    aggs : Mapping[str, Tuple[str, str]]
+        Output column -> (source column, aggregation function)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        date_col: str,
+        keys: Iterable[str],
+        aggs: Mapping[str, Tuple[str, str]],
+    ):
+        self.name = name
+        self.date_col = date_col
+        self.keys = list(keys)
+        self.aggs = dict(aggs)
+        self._table: Optional[pd.DataFrame] = None
+        self._source: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _aggregate(self, df: pd.DataFrame) -> pd.DataFrame:
+        dates = pd.to_datetime(df[self.date_col], utc=True)
+        day = dates.dt.tz_localize(None).dt.normalize().rename("date")
+        grouped = df.groupby([day] + [df[k] for k in self.keys], observed=True)
+        return grouped.agg(**self.aggs).reset_index()
+
+    def _dtypes(self, df: pd.DataFrame) -> dict:
+        columns = [self.date_col] + self.keys + [c for c, _ in self.aggs.values()]
+        return {c: str(df[c].dtype) for c in dict.fromkeys(columns)}
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Add the days of ``df`` from the last stored day onwards, and return the rollup"""
+        source = str(fingerprint(df))
+        dtypes = self._dtypes(df)
+        # As read back from the JSON metadata
+        aggs = {k: list(v) for k, v in self.aggs.items()}
+        with self._lock:
+            if source == self._source:
+                return self._table
+            with entry_lock(self.name):
+                entry = read_frame(self.name)
+                table, meta = entry if entry is not None else (None, {})
+                if table is not None and (
+                    meta.get("dtypes") != dtypes or meta.get("aggs") != aggs
+                ):
+                    logger.info("%s: definition changed, rebuilding", self.name)
+                    table, meta = None, {}
+                if table is not None and meta.get("source") == source:
+                    table = table.copy()
+                else:
+                    table = self._extend(table, df)
+                    write_frame(
+                        self.name,
+                        table,
+                        ttl=TTL,
+                        source=source,
+                        dtypes=dtypes,
+                        aggs=aggs,
+                    )
+            self._table, self._source = table, source
+            return table
+
+    def _extend(self, table: Optional[pd.DataFrame], df: pd.DataFrame) -> pd.DataFrame:
+        if table is None or table.empty:
+            return self._aggregate(df)
+        last = table["date"].max()
+        dates = pd.to_datetime(df[self.date_col], utc=True).dt.tz_localize(None)
+        new = self._aggregate(df[(dates >= last).to_numpy()])
+        logger.info("%s: %d new rows from %s", self.name, len(new), last.date())
+        table = pd.concat([table[table["date"] < last], new], ignore_index=True)
+        return table.sort_values(["date"] + self.keys, ignore_index=True)
@@ -0,0 +1,81 @@
+"""Declarative column types for query results.
+
+A schema maps column names to one of the type names in :data:`SCHEMA_TYPES`.
+:func:`common.data_cache.read_query` applies it once when a result is
+downloaded, so the cached Feather file is already typed and dashboards don't
+need to convert the same columns on every rerun::
+
+    schema = {
+        "Date": "datetime",
+        "ACTION_TYPE": "category",
+        "Total Actions": "int32",
+        "Total Token Amount": "float",
+    }
+
+Columns missing from a result are skipped, so a query can gain or lose columns
+without breaking the loader.
+"""
+
+from collections.abc import Mapping
+from decimal import Decimal, InvalidOperation
+
+import pandas as pd
+
+__all__ = ["SCHEMA_TYPES", "apply_schema"]
+
+
+def _to_decimal(x):
+    try:
+        return Decimal(x)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def _numeric(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce")
+
+
+def _integer(dtype: str):
+    def convert(s: pd.Series) -> pd.Series:
+        s = _numeric(s)
+        # Like pd.to_numeric, keep floats when values are missing
+        return s if s.isna().any() else s.astype(dtype)
+
+    return convert
+
+
+SCHEMA_TYPES = {
+    "float": lambda s: _numeric(s).astype("float64"),
+    # Halves the memory of columns that are only displayed or averaged
+    "float32": lambda s: _numeric(s).astype("float32"),
+    "int": _integer("int64"),
+    "int32": _integer("int32"),
+    "datetime": lambda s: pd.to_datetime(s, errors="coerce"),
+    "category": lambda s: s.astype("category"),
+    # Exact big integers, e.g. raw token amounts beyond float64 precision
+    "decimal": lambda s: s.map(_to_decimal),
+    "str": lambda s: s.astype(str),
+}
+
+
+def apply_schema(df: pd.DataFrame, schema: Mapping[str, str]) -> pd.DataFrame:
+    """Convert the columns of a query result to the types in a schema
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Query result, modified in place
+    schema : Mapping[str, str]
+        Column names mapped to keys of SCHEMA_TYPES
+
+    Returns
+    -------
+    pd.DataFrame
+        The converted frame
+    """
+    for col, kind in schema.items():
+        if kind not in SCHEMA_TYPES:
+            raise ValueError(f"Unknown schema type {kind!r} for column {col!r}")
+        if col in df.columns:
+            df[col] = SCHEMA_TYPES[kind](df[col])
+    return df
@@ -0,0 +1,32 @@
+"""Summary statistics shared by the dashboards."""
+
+import numpy as np
+
+__all__ = ["gini"]
+
+
+def gini(array: np.array) -> float:
+    """Calculate the Gini coefficient of a numpy array.
+
+    From https://github.com/oliviaguest/gini
+
+    based on bottom eq:
+    http://www.statsdirect.com/help/generatedimages/equations/equation154.svg
+    from:
+    http://www.statsdirect.com/help/default.htm#nonparametric_methods/gini.htm
+    """
+    # All values are treated equally, arrays must be 1d floats:
+    array = np.asarray(array, dtype=float).flatten()
+    if np.amin(array) < 0:
+        # Values cannot be negative:
+        array -= np.amin(array)
+    # Values cannot be 0:
+    array += 0.0000001
+    # Values must be sorted:
+    array = np.sort(array)
+    # Index per array element:
+    index = np.arange(1, array.shape[0] + 1)
+    # Number of array elements:
+    n = array.shape[0]
+    # Gini coefficient:
+    return (np.sum((2 * index - n - 1) * array)) / (n * np.sum(array))
@@ -0,0 +1,88 @@
+"""Conversion of yoctoNEAR amounts (10^-24 NEAR) to NEAR.
+
+NEAR APIs return balances and stakes as decimal strings of integers around
+10^24 to 10^33, too large for int64. :func:`convert_to_near` converts a whole
+column in one pass with Arrow compute kernels: the strings are validated with a
+regex and parsed to float64 (or, with ``exact=True``, to 76 digit decimals)
+without creating a Python int per row. Float results may differ from exact
+division by 10^24 in their last bit; use ``exact=True`` where that matters.
+"""
+
+from decimal import Decimal
+from typing import Iterable, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+__all__ = ["YOCTO_DIGITS", "convert_to_near"]
+
+YOCTO_DIGITS = 24
+_AMOUNT = r"^[+-]?[0-9]+$"
+# 10**24 doesn't fit in int64, so numpy would divide arrays by it as objects
+_SCALE = 10.0**YOCTO_DIGITS
+
+
+def _to_near(values: pd.Series, exact: bool) -> np.ndarray:
+    if not exact and pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float) / _SCALE
+
+    try:
+        text = pa.array(values, type=pa.string(), from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):  # Python ints mixed in
+        text = pa.array(values.map(str, na_action="ignore"), from_pandas=True)
+    text = pc.utf8_trim_whitespace(text)
+    valid = pc.fill_null(pc.match_substring_regex(text, _AMOUNT), True)
+    if not pc.all(valid).as_py():
+        bad = text.filter(pc.invert(valid))[0].as_py()
+        raise ValueError(f"Not a yoctoNEAR amount: {bad!r}")
+
+    if exact:
+        yocto = pc.cast(text, pa.decimal256(76, 0)).to_pylist()
+        near = [None if x is None else x.scaleb(-YOCTO_DIGITS) for x in yocto]
+        return np.array(near, dtype=object)
+    yocto = pc.cast(text, pa.float64()).to_numpy(zero_copy_only=False)
+    return yocto / _SCALE
+
+
+def convert_to_near(
+    yNEAR: Union[str, int, float, Iterable], exact: bool = False
+) -> Union[float, Decimal, np.ndarray]:
+    """Convert yoctoNEAR amounts to NEAR
+
+    Parameters
+    ----------
+    yNEAR : Union[str, int, float, Iterable]
+        A single amount, or a column of amounts, as integer strings or numbers
+    exact : bool, optional
+        Return ``decimal.Decimal`` values instead of floats, by default False
+
+    Returns
+    -------
+    Union[float, Decimal, np.ndarray]
+        The amount in NEAR for a single value, otherwise an array with one
+        value per amount (NaN, or None if ``exact``, for missing amounts)
+
+    Examples
+    --------
+    >>> print(convert_to_near("3000000000000000000000000"))
+    3.0
+    >>> convert_to_near(np.float64(2e24)), convert_to_near(1.5e24)
+    (2.0, 1.5)
+    >>> convert_to_near(15 * 10**23, exact=True)
+    Decimal('1.500000000000000000000000')
+    >>> convert_to_near(["5" + "0" * 23, None])
+    array([0.5, nan])
+    """
+    if isinstance(yNEAR, str):
+        return _to_near(pd.Series([yNEAR], dtype=object), exact)[0]
+    if np.isscalar(yNEAR):
+        if pd.isna(yNEAR):
+            return None if exact else np.nan
+        if exact:
+            return Decimal(int(yNEAR)).scaleb(-YOCTO_DIGITS)
+        return int(yNEAR) / 10**YOCTO_DIGITS
+    if not isinstance(yNEAR, pd.Series):
+        yNEAR = pd.Series(list(yNEAR), dtype=object)
+    return _to_near(yNEAR, exact)
@@ -2,7 +2,12 @@ import altair as alt
 from collections.abc import Mapping
 import datetime
 import pandas as pd
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_queries
 
 
 __all__ = ["query_information", "load_data", "date_df", "update_player_name"]
@@ -94,8 +99,11 @@ def load_data(
     dfs = {}
     combined = []
 
-    for v in query_information.values():
-        df = pd.read_json(v["api"])
+    results = read_queries(
+        {k: v["api"] for k, v in query_information.items()}, ttl=3600 * 12
+    )
+    for k, v in query_information.items():
+        df = results[k]
         if v["short_name"].startswith("nft"):
             name = v["short_name"].split("_")[-1]
             df["type"] = name
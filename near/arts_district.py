@@ -1,5 +1,7 @@
 import io
 import random
+import sys
+from pathlib import Path
 
 import altair as alt
 import pandas as pd
@@ -8,6 +10,10 @@ from shroomdk import ShroomDK, errors
 import streamlit as st
 from PIL import Image
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.yocto import convert_to_near
+
 # import near_info
 
 st.set_page_config(page_title="Citizens of NEAR: Arts District", page_icon="🌆")
@@ -34,11 +40,13 @@ def get_flipside_data(query, cached=True, save=False):
 
 @st.cache(ttl=24 * 60)
 def load_data():
-    sales_volume_df = pd.read_json(
-        "https://node-api.flipsidecrypto.com/api/v2/queries/6ae95685-436d-4682-8d8b-dec364692ed9/data/latest"
+    sales_volume_df = read_query(
+        "https://node-api.flipsidecrypto.com/api/v2/queries/6ae95685-436d-4682-8d8b-dec364692ed9/data/latest",
+        ttl=24 * 60,
     )
-    top_projects_df = pd.read_json(
-        "https://node-api.flipsidecrypto.com/api/v2/queries/89c38bbf-9c3b-41d1-a92e-b12d4bdce055/data/latest"
+    top_projects_df = read_query(
+        "https://node-api.flipsidecrypto.com/api/v2/queries/89c38bbf-9c3b-41d1-a92e-b12d4bdce055/data/latest",
+        ttl=24 * 60,
     )
     return sales_volume_df, top_projects_df
 
@@ -81,12 +89,12 @@ def print_stats(x):
         pass
     try:
         volume = x["volume"]
-        s += f"- Volume: {int(volume)/10**24:.2f} NEAR\n"
+        s += f"- Volume: {convert_to_near(volume):.2f} NEAR\n"
     except:
         pass
     try:
         floor_price = x["floor_price"]
-        s += f"- Floor Price: {int(floor_price)/10**24:.2f} NEAR\n"
+        s += f"- Floor Price: {convert_to_near(floor_price):.2f} NEAR\n"
     except:
         pass
     return s
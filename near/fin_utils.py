@@ -1,11 +1,25 @@
+import hashlib
+import sys
 from collections.abc import Mapping
 from datetime import datetime, timedelta
-from typing import Iterable, Union
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional, Sequence, Union
 
 import altair as alt
+import numpy as np
 import pandas as pd
 import requests
-import streamlit as st
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.charts import escape_field, pivot_wide
+from common.data_cache import FINGERPRINT_HASH_FUNCS, read_queries, set_fingerprint
+from common.downsample import MAX_POINTS, downsample_area, downsample_line
+from common.fetch import TIMEOUT, Endpoint, FetchPlan, session
+from common.flatten import Field, flatten
+from common.instrument import cached, instrument
+from common.panel import DatePanel
+from common.rollup import DailyRollup
+from common.stats import gini
 
 # from shroomdk import ShroomDK
 
@@ -17,17 +31,29 @@ import streamlit as st
 __all__ = [
     # Variables/info/schema
     "query_information",
+    "TokenRegistry",
+    "token_registry",
     "get_pair_from_token_id",
     "get_price_df",
+    "get_price_series",
     "get_decimals",
+    "FlowAmount",
+    "normalize_flows",
     # Data
     "get_ref_data",
+    "gini",
+    "holder_concentration",
+    "prefetch_holders",
     "get_lp",
     "get_price",
     "get_accounts",
     "load_data",
     "get_rewards_by_token",
     "get_pool_deposit_withdraws",
+    "LiquidityCube",
+    "liquidity_cube",
+    "stablecoin_rankings",
+    "get_stablecoin_daily",
     # Charting
     "alt_date_area",
     "alt_date_line",
@@ -40,6 +66,7 @@ __all__ = [
     "alt_reward_bar",
     "alt_pool_liquidity",
     "alt_stable_user",
+    "alt_stable_volume",
 ]
 
 
@@ -49,16 +76,27 @@ query_information = {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/d2c62cd6-483a-4a8f-8640-609cb06be5f1/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/d2c62cd6-483a-4a8f-8640-609cb06be5f1",
         "short_name": "reward_claims",
+        "schema": {
+            "Date": "datetime",
+            "Reward Claims": "int32",
+        },
     },
     "Ref Reward Claims by Token": {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/7f9b4890-5ad2-44c0-b596-e9f60650d927/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/7f9b4890-5ad2-44c0-b596-e9f60650d927",
         "short_name": "reward_claims_by_token",
+        "schema": {
+            "Date": "datetime",
+            "Total Amount": "float",
+        },
     },
     "Ref Reward Claims by Top Users": {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/7d7ab9bc-66a2-4c9d-ba0a-445d43c7c558/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/7d7ab9bc-66a2-4c9d-ba0a-445d43c7c558",
         "short_name": "reward_claims_by_user",
+        "schema": {
+            "Total Amount": "float",
+        },
     },
     # "Ref Farm Deposits and Withdraws": {  # Not using for now
     #     "api": "https://node-api.flipsidecrypto.com/api/v2/queries/dc9e9c76-d999-4fb8-aa90-6f73cc544117/data/latest",
@@ -69,158 +107,443 @@ query_information = {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/b2c7877e-f140-4085-bb09-4949292843a2/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/b2c7877e-f140-4085-bb09-4949292843a2",
         "short_name": "pool_deposit_withdraws",
+        "schema": {
+            "Date": "datetime",
+            "POOL_ID": "int",
+            "ACTION_TYPE": "category",
+            "Total Actions": "int32",
+            "Total Token Amount": "float",
+            "Average Average Token Amount": "float",
+        },
     },
     "NEAR Stablecoin Transactions": {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/59a1b7b6-84ad-4848-9788-a9a09f745e2c/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/59a1b7b6-84ad-4848-9788-a9a09f745e2c",
         "short_name": "stablecoin_tx",
+        "schema": {
+            "Date": "datetime",
+            "Symbol": "category",
+            "Total Amount": "float",
+        },
     },
     "NEAR Stablecoins by Top Users": {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/7d475d16-cdbb-4073-aefb-9bc980056677/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/7d475d16-cdbb-4073-aefb-9bc980056677",
         "short_name": "stablecoin_top_users",
+        "schema": {
+            "Symbol": "category",
+            "ROW_NUMBER": "int32",
+            "Total Amount": "float",
+        },
     },
 }
 
 
 # Utilities
-def convert_to_near(yNEAR: Union[str, Iterable]) -> float:
-    if type(yNEAR) == str:
-        return int(yNEAR) / 10**24
-    else:
-        return [int(x) / 10**24 for x in yNEAR]
+class TokenRegistry:
+    """Token metadata from Ref's ``ft`` endpoint, indexed by token account id
+
+    Built once per ``ft`` payload (see :func:`token_registry`), so lookups and
+    decimal conversions don't filter the full table for every token.
+
+    Parameters
+    ----------
+    ft : pd.DataFrame
+        Ref ``ft`` data, with ``token_account_id``, ``name``, ``symbol`` and ``decimals`` columns
+    """
+
+    def __init__(self, ft: pd.DataFrame):
+        table = ft.drop_duplicates("token_account_id")[
+            ["name", "symbol", "token_account_id", "decimals"]
+        ]
+        table = table.set_index("token_account_id", drop=False)
+        table["decimals_raw"] = pd.to_numeric(table["decimals"])
+        self.table = table
+        self.symbol_by_id = table["symbol"].to_dict()
+        # Symbols aren't unique on Ref; the first listed token wins
+        self.id_by_symbol = (
+            table.drop_duplicates("symbol")
+            .set_index("symbol")["token_account_id"]
+            .to_dict()
+        )
+        self._conversions = {}
+
+    def __len__(self):
+        return len(self.table)
+
+    def __contains__(self, token_id):
+        return token_id in self.symbol_by_id
+
+    def conversions(self, precorrection=18) -> pd.DataFrame:
+        """Metadata and conversion factor of every token
+
+        ``decimals`` is reduced by ``precorrection`` (for amounts that were
+        already divided by ``10**precorrection``), and ``conversion_factor`` is
+        ``10**decimals``.
+        """
+        if precorrection not in self._conversions:
+            df = self.table.copy()
+            df["decimals"] = df["decimals_raw"] - (precorrection or 0)
+            df["conversion_factor"] = np.power(10.0, df["decimals"].astype(float))
+            self._conversions[precorrection] = df
+        return self._conversions[precorrection]
+
+    def decimals(self, token_ids: Iterable[str], precorrection=18) -> pd.DataFrame:
+        """:meth:`conversions` rows for the known tokens among ``token_ids``"""
+        df = self.conversions(precorrection)
+        ids = pd.unique(pd.Series(token_ids, dtype=object))
+        return df.loc[df.index.intersection(ids)].reset_index(drop=True)
+
+    def symbols(self, token_ids: Iterable[str]) -> list:
+        """Symbol of each token, or its account id if it isn't listed"""
+        return [self.symbol_by_id.get(x, x) for x in token_ids]
+
+    def pair_names(self, token_id_lists: pd.Series) -> pd.Series:
+        """Name every pool from its token account ids in one pass, e.g. ``wNEAR-USDC``"""
+        exploded = token_id_lists.reset_index(drop=True).explode().dropna()
+        symbols = exploded.map(self.symbol_by_id).fillna(exploded).astype(str)
+        names = symbols.groupby(level=0).agg("-".join)
+        names = names.reindex(range(len(token_id_lists)), fill_value="")
+        return pd.Series(names.values, index=token_id_lists.index, name="Pair")
+
+
+@cached("transform", allow_output_mutation=True, hash_funcs=FINGERPRINT_HASH_FUNCS)
+def token_registry(ft: pd.DataFrame) -> TokenRegistry:
+    return TokenRegistry(ft)
 
 
 def get_pair_from_token_id(x, df):
-    symbols = []
-    for y in x:
-        symbol = df[df["token_account_id"] == y].symbol.values[0]
-        symbols.append(symbol)
-    return "-".join(symbols)
+    return "-".join(token_registry(df).symbols(x))
 
 
+@instrument()
 def get_price_df(token_list, df):
-    token_ids = df.loc[df.symbol.isin(token_list), "token_id"].values
-    price_dfs = []
-    for x, y in zip(token_ids, token_list):
-        df = get_price(x).copy()
-        df["Token ID"] = x
-        df["Symbol"] = y
-        df["price"] = pd.to_numeric(df.price)
-        price_dfs.append(df)
-    price_df = pd.concat(price_dfs)
-    return price_df
+    """Daily prices of the tokens with symbols in ``token_list``, in long format
+
+    ``df`` maps symbols to token ids (``symbol`` and ``token_id`` columns).
+    """
+    token_ids = (
+        df.drop_duplicates("symbol").set_index("symbol")["token_id"].reindex(token_list)
+    ).dropna()
+    prices = price_panel.frame(token_ids.values).rename_axis(index="date")
+    price_df = prices.reset_index().melt(
+        id_vars="date", var_name="Token ID", value_name="price"
+    )
+    price_df = price_df.dropna(subset=["price"])
+    price_df["Symbol"] = price_df["Token ID"].map(
+        dict(zip(token_ids.values, token_ids.index))
+    )
+    return price_df.reset_index(drop=True)
+
 
+@cached("transform", ttl=3600 * 12, hash_funcs=FINGERPRINT_HASH_FUNCS)
+def get_price_series(token_list, df, date_range=None) -> pd.DataFrame:
+    """Prices of ``token_list`` ready for :func:`alt_date_line`, sorted by date
 
+    An int ``date_range`` keeps only the last ``date_range`` days. Cached per
+    token list, ``df`` and date range, so reruns drawing the same chart skip
+    the price lookup and sort.
+    """
+    price_df = get_price_df(token_list, df).sort_values(by="date", kind="stable")
+    if type(date_range) == int:
+        dates = price_df.date.drop_duplicates()
+        price_df = price_df[price_df.date.isin(dates.iloc[-date_range:])]
+    return price_df.reset_index(drop=True)
+
+
+@instrument()
 def get_decimals(token_ids: pd.Series, ft: pd.DataFrame, precorrection=18):
-    df = ft[ft.token_account_id.isin(token_ids)][
-        ["name", "symbol", "token_account_id", "decimals"]
-    ]
-    df["decimals_raw"] = pd.to_numeric(df["decimals"])
-    if precorrection:
-        df["decimals"] = df["decimals_raw"] - precorrection
-    else:
-        df["decimals"] = df["decimals_raw"]
-    df["conversion_factor"] = 10 ** (df.decimals.apply(float))
+    return token_registry(ft).decimals(token_ids, precorrection)
+
+
+class FlowAmount(NamedTuple):
+    """A raw amount column of a flow table and the names of its converted columns"""
+
+    column: str
+    name: str
+    usd: Optional[str] = None
+
+
+@instrument()
+def normalize_flows(
+    flows: pd.DataFrame,
+    ft: pd.DataFrame,
+    token_col: str,
+    amounts: Sequence[FlowAmount],
+    date_col: Optional[str] = "Date",
+    precorrection=18,
+) -> pd.DataFrame:
+    """Convert the raw token amounts of a flow table to token units and USD
+
+    Token metadata and conversion factors come from the cached
+    :class:`TokenRegistry`, and daily prices from ``price_panel``, so both are
+    looked up by position rather than merged for every table.
+
+    Parameters
+    ----------
+    flows : pd.DataFrame
+        Table with a token account id and raw amounts on each row
+    ft : pd.DataFrame
+        Ref token metadata
+    token_col : str
+        Column of ``flows`` with the token account ids
+    amounts : Sequence[FlowAmount]
+        Amounts to convert. ``column`` is kept as ``Raw <name>``, converted to
+        token units as ``name``, and to USD as ``usd`` if it is set
+    date_col : str, optional
+        Column of ``flows`` with the date of each row, by default "Date". If None, no prices are added
+    precorrection : int, optional
+        Decimals already removed from the raw amounts, by default 18
+
+    Returns
+    -------
+    pd.DataFrame
+        Rows of ``flows`` for known tokens, with the token's metadata, ``token_id``, the converted amounts and, with ``date_col``, ``Symbol`` and ``price``
+    """
+    conversions = token_registry(ft).conversions(precorrection)
+    rows = conversions.index.get_indexer(flows[token_col])
+    known = rows >= 0
+    df = flows[known].reset_index(drop=True)
+    meta = conversions.iloc[rows[known]].reset_index(drop=True)
+    for col in meta:
+        df[col] = meta[col].values
+    df["token_id"] = df[token_col]
+    factor = meta["conversion_factor"].to_numpy(dtype=float)
+
+    if date_col is not None:
+        df["Symbol"] = df.symbol
+        df["price"] = price_panel.lookup(df.token_id, df[date_col])
+    for amount in amounts:
+        raw = pd.to_numeric(df[amount.column], errors="coerce").to_numpy(dtype=float)
+        df[f"Raw {amount.name}"] = raw
+        df[amount.name] = raw / factor
+        if amount.usd is not None and date_col is not None:
+            df[amount.usd] = df[amount.name] * df["price"]
     return df
 
 
 # Data
-@st.cache(ttl=3600)
-def get_ref_data() -> Mapping[
-    str, Mapping[str, Union[pd.DataFrame, str, int, dict, list]]
-]:
-    ref_data = {
-        "volume_variation_24h": {
-            "url": "https://api.stats.ref.finance/api/24h-volume-variation",
-        },
-        "ft": {
-            "url": "https://api.stats.ref.finance/api/ft",
-        },
-        "historical_tvl_all": {
-            "url": "https://api.stats.ref.finance/api/historical-tvl?period=730",
-        },
-        "last_tvl": {
-            "url": "https://api.stats.ref.finance/api/last-tvl",
-        },
-        "top_pools": {
-            "url": "https://api.stats.ref.finance/api/top-pools",
-        },
-        "top_tokens": {
-            "url": "https://api.stats.ref.finance/api/top-tokens",
-        },
-        "volume_24h_all": {
-            "url": "https://api.stats.ref.finance/api/volume24h?period=730",
-        },
-        "pool_number": {
-            "url": "https://api.stats.ref.finance/api/pool-number",
-        },
-        "active_pool_number": {
-            "url": "https://api.stats.ref.finance/api/active-pool-number",
-        },
-        "all_pairs": {
-            "url": "https://api.stats.ref.finance/api/all-pairs",
-        },
-        "all_farms": {
-            "url": "https://api.stats.ref.finance/api/all-farms",
-        },
-        "average_farming_rate": {
-            "url": "https://api.stats.ref.finance/api/average-farming-rate",
-        },
-        "last_farming_stats": {
-            "url": "https://api.stats.ref.finance/api/last-farming-stats",
-        },
-        "pools": {
-            "url": "https://api.stats.ref.finance/api/pools",
-        },
-        "mcap": {
-            "url": "https://api.stats.ref.finance/api/marketcap",
-        },
-        "seeds": {
-            "url": "https://api.stats.ref.finance/api/seeds",
-        },
-        "ref_holders": {
-            "url": "https://api.stats.ref.finance/api/ref-holders",
-        },
+# Ref Finance stats API endpoints. Each is cached for as long as its data is
+# expected to stay the same: aggregate 24h/latest stats change by the minute,
+# pool and farm listings hourly, and token metadata and 730 day histories daily.
+REF_API = "https://api.stats.ref.finance/api"
+REALTIME = 5 * 60
+HOURLY = 3600
+DAILY = 3600 * 12
+ref_endpoints = {
+    "volume_variation_24h": Endpoint(f"{REF_API}/24h-volume-variation", REALTIME),
+    "ft": Endpoint(f"{REF_API}/ft", DAILY),
+    "historical_tvl_all": Endpoint(f"{REF_API}/historical-tvl?period=730", DAILY),
+    "last_tvl": Endpoint(f"{REF_API}/last-tvl", REALTIME),
+    "top_pools": Endpoint(f"{REF_API}/top-pools", HOURLY),
+    "top_tokens": Endpoint(f"{REF_API}/top-tokens", HOURLY),
+    "volume_24h_all": Endpoint(f"{REF_API}/volume24h?period=730", DAILY),
+    "pool_number": Endpoint(f"{REF_API}/pool-number", HOURLY),
+    "active_pool_number": Endpoint(f"{REF_API}/active-pool-number", HOURLY),
+    "all_pairs": Endpoint(f"{REF_API}/all-pairs", HOURLY),
+    "all_farms": Endpoint(f"{REF_API}/all-farms", HOURLY),
+    "average_farming_rate": Endpoint(f"{REF_API}/average-farming-rate", HOURLY),
+    "last_farming_stats": Endpoint(f"{REF_API}/last-farming-stats", REALTIME),
+    "pools": Endpoint(f"{REF_API}/pools", HOURLY),
+    "mcap": Endpoint(f"{REF_API}/marketcap", HOURLY),
+    "seeds": Endpoint(f"{REF_API}/seeds", HOURLY),
+    "ref_holders": Endpoint(f"{REF_API}/ref-holders", DAILY),
+}
+# Typed columns of the endpoints' tables, flattened from nested objects where
+# needed. Other columns are kept as returned by the API.
+ref_fields = {
+    "historical_tvl_all": {
+        "date": Field("historicalTVL.date", "datetime"),
+        "totalUsdTvl": Field("historicalTVL.totalUsdTvl", "float"),
+        "usdNear": Field("historicalTVL.usdNear", "float"),
+    },
+    "volume_24h_all": {
+        "date": Field("date", "datetime"),
+        "volume": Field("volume", "float"),
+    },
+    "top_tokens": {
+        "tvl": Field("tvl", "float"),
+        "volume24h": Field("volume24h", "float"),
+        "price": Field("price", "float"),
+    },
+    "top_pools": {
+        "tvl": Field("tvl", "float"),
+        "volume24hinUSD": Field("volume24hinUSD", "float"),
+    },
+    "all_farms": {
+        "farm_id": Field("farm_id", "str"),
+        "seed_id": Field("seed_id", "str"),
+    },
+    "last_farming_stats": {
+        "farm_count": Field("farm_count", "float"),
+        "farmer_count": Field("farmer_count", "float"),
+        "reward_count": Field("reward_count", "float"),
+    },
+}
+
+
+def _parse_ref_response(name: str, r: requests.Response) -> dict:
+    entry = {
+        "url": ref_endpoints[name].url,
+        "data": r.json(),
+        # Version token for the frame, so cached transforms can key on it
+        "etag": r.headers.get("ETag") or hashlib.sha1(r.content).hexdigest(),
     }
+    try:
+        df = pd.DataFrame(entry["data"])
+    except ValueError:
+        return entry
+    if name in ref_fields:
+        df = flatten(df, ref_fields[name])
+    entry["df"] = set_fingerprint(df, entry["etag"])
+    return entry
 
-    for k, v in ref_data.items():
-        r = requests.get(v["url"])
-        ref_data[k]["data"] = r.json()
-    for k, v in ref_data.items():
-        try:
-            ref_data[k]["df"] = pd.DataFrame(v["data"])
-        except ValueError:
-            pass
-    return ref_data
 
+ref_plan = FetchPlan(ref_endpoints, parse=_parse_ref_response)
 
-@st.cache(ttl=3600 * 12)
-def get_lp(pool_id: int) -> dict:
-    url = f"https://api.stats.ref.finance/api/pool/{pool_id}/lp"
-    r = requests.get(url)
+
+@instrument("load")
+def get_ref_data(
+    names: Optional[Iterable[str]] = None,
+) -> Mapping[str, Mapping[str, Union[pd.DataFrame, str, int, dict, list]]]:
+    """Load data from the Ref Finance stats API
+
+    Only endpoints that are missing or past their TTL are downloaded, in
+    parallel over a shared keep-alive session.
+
+    Parameters
+    ----------
+    names : Iterable[str], optional
+        Endpoints to load, see ``ref_endpoints``, by default all of them
+
+    Returns
+    -------
+    Dict
+        For each endpoint, its ``url``, JSON ``data``, ``etag`` and, if the data is tabular, ``df`` (typed as in ``ref_fields``)
+    """
+    return {k: dict(v) for k, v in ref_plan.fetch(names).items()}
+
+
+# LP shares of pools and farm (seed) accounts. The top pools and their farms
+# are fetched in the background, with their concentration stats, so picking one
+# of them in the dashboard doesn't wait on Ref's API.
+HOLDER_PREFETCH = 20
+TOP_HOLDERS = 10
+
+
+def holder_concentration(prct: pd.Series) -> dict:
+    """Number of holders, share held by the top ``TOP_HOLDERS`` and Gini coefficient"""
+    values = np.sort(pd.to_numeric(prct).dropna().to_numpy(dtype=float))[::-1]
+    if len(values) == 0 or values.sum() == 0:
+        return {"holder_count": len(values), "top_10_share": np.nan, "gini": np.nan}
+    return {
+        "holder_count": len(values),
+        "top_10_share": values[:TOP_HOLDERS].sum() / values.sum(),
+        "gini": gini(values.copy()),
+    }
+
+
+def _parse_holders(name: str, r: requests.Response) -> dict:
     data = r.json()
-    return data
+    if name.startswith("lp/"):
+        entry = {"created_at": data["pool"]["createdAt"]}
+        holders = pd.DataFrame(data["pool"]["shares"])
+    else:
+        entry = {}
+        holders = pd.DataFrame(data["accounts"])
+        if "accounts" in holders:
+            holders = pd.concat(
+                [holders, pd.json_normalize(holders["accounts"])], axis=1
+            ).drop(columns="accounts")
+    if "prct" not in holders:
+        holders["prct"] = np.nan
+    holders["prct"] = pd.to_numeric(holders.prct)
+    entry["holders"] = holders.sort_values("prct", ascending=False, ignore_index=True)
+    entry.update(holder_concentration(holders.prct))
+    return entry
+
+
+def _holder_endpoints(pool_ids: Iterable = (), seeds: Iterable[str] = ()) -> dict:
+    endpoints = {f"lp/{x}": Endpoint(f"{REF_API}/pool/{x}/lp", DAILY) for x in pool_ids}
+    endpoints.update(
+        {f"seed/{x}": Endpoint(f"{REF_API}/seed/{x}/accounts", DAILY) for x in seeds}
+    )
+    return endpoints
+
+
+holder_plan = FetchPlan({}, parse=_parse_holders)
+
+
+def prefetch_holders(pools: pd.DataFrame, farms: pd.DataFrame, n=HOLDER_PREFETCH):
+    """Fetch the holders of the top ``n`` pools and farms by TVL in the background
 
+    Farms are ranked by the TVL of their pool.
 
-@st.cache(ttl=3600 * 12, allow_output_mutation=True)
+    Parameters
+    ----------
+    pools : pd.DataFrame
+        Pools, with ``pool_id`` and ``Current TVL`` columns
+    farms : pd.DataFrame
+        Farms, with a ``seed_id`` column (``<exchange>@<pool_id>``)
+    n : int, optional
+        Number of pools and of farms to fetch, by default HOLDER_PREFETCH
+    """
+    pool_ids = pools.nlargest(n, "Current TVL").pool_id
+    tvl = pools.groupby(pools.pool_id.astype(str))["Current TVL"].max()
+    seeds = pd.Series(pd.unique(farms.seed_id))
+    seed_tvl = seeds.str.split("@").str[-1].map(tvl)
+    seeds = seeds[seed_tvl.sort_values(ascending=False).index[:n]]
+    endpoints = _holder_endpoints(pool_ids, seeds)
+    holder_plan.add(endpoints)
+    return holder_plan.prefetch(endpoints)
+
+
+@instrument("load")
+def get_lp(pool_id: int) -> dict:
+    """LP shares of a pool
+
+    Returns
+    -------
+    Dict
+        ``created_at``, ``holders`` (one row per account, largest ``prct`` first) and the :func:`holder_concentration` stats
+    """
+    name = f"lp/{pool_id}"
+    holder_plan.add(_holder_endpoints(pool_ids=[pool_id]))
+    return holder_plan.fetch([name])[name]
+
+
+def _fetch_price_history(token_id: str) -> pd.Series:
+    r = session().get(
+        f"{REF_API}/price-data", params={"tokenId": token_id}, timeout=TIMEOUT
+    )
+    r.raise_for_status()
+    df = pd.DataFrame(r.json())
+    if df.empty:
+        return pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+    return pd.Series(df.price.values, index=pd.to_datetime(df.date, utc=True))
+
+
+# Daily price of every token requested so far, stored on disk and shared by
+# all dashboard processes. Refreshing a token only appends its new days.
+price_panel = DatePanel("ref_prices", _fetch_price_history, ttl=3600 * 12)
+
+
+@instrument("load")
 def get_price(token_id: str) -> pd.DataFrame:
-    url = f"https://api.stats.ref.finance/api/price-data?tokenId={token_id}"
-    r = requests.get(url)
-    data = r.json()
-    df = pd.DataFrame(data)
-    return df
+    """Daily price history of a token, with ``date`` and ``price`` columns"""
+    prices = price_panel.frame([token_id])[token_id].dropna()
+    return prices.rename("price").rename_axis("date").reset_index()
 
 
-@st.cache(ttl=3600 * 12)
+@instrument("load")
 def get_accounts(seed: str) -> dict:
-    url = f"https://api.stats.ref.finance/api/seed/{seed}/accounts"
-    r = requests.get(url)
-    data = r.json()
-    return data
+    """Accounts farming a seed, as returned by :func:`get_lp` for pools"""
+    name = f"seed/{seed}"
+    holder_plan.add(_holder_endpoints(seeds=[seed]))
+    return holder_plan.fetch([name])[name]
 
 
-@st.cache(ttl=(3600 * 12), allow_output_mutation=True)
+@cached("load", ttl=(3600 * 12), allow_output_mutation=True)
 def load_data(
     query_information: Mapping[str, Mapping[str, str]] = query_information
 ) -> Mapping[str, pd.DataFrame]:
@@ -237,100 +560,188 @@ def load_data(
         Dict of dataframes
     """
 
-    dfs = {}
-
-    for v in query_information.values():
-        df = pd.read_json(v["api"], dtype=str)
-        dfs[v["short_name"]] = df
+    urls = {v["short_name"]: v["api"] for v in query_information.values()}
+    schemas = {
+        v["short_name"]: v["schema"]
+        for v in query_information.values()
+        if "schema" in v
+    }
+    dfs = read_queries(urls, ttl=3600 * 12, schemas=schemas, dtype=str)
 
     return dfs
 
 
-@st.cache(ttl=(3600 * 12))
+@cached("transform", ttl=(3600 * 12), hash_funcs=FINGERPRINT_HASH_FUNCS)
 def get_rewards_by_token(dfs, ft):
-    rewards_by_token = dfs["reward_claims_by_token"]
-    token_conversions = get_decimals(rewards_by_token.TOKEN_ID, ft)
-    rewards_by_token = rewards_by_token.merge(
-        token_conversions,
-        left_on="TOKEN_ID",
-        right_on="token_account_id",
-    )
-    rewards_by_token["token_id"] = rewards_by_token.TOKEN_ID
-    rewards_by_token["Date"] = pd.to_datetime(rewards_by_token.Date)
-    rewards_by_token["Raw Total Amount"] = pd.to_numeric(
-        rewards_by_token["Total Amount"]
-    )
-    rewards_by_token["Total Amount"] = (
-        rewards_by_token["Raw Total Amount"] / rewards_by_token["conversion_factor"]
-    )
-    price_df = get_price_df(rewards_by_token.symbol.unique(), rewards_by_token)
-    price_df["Date"] = pd.to_datetime(
-        pd.to_datetime(price_df.date).dt.strftime("%Y-%m-%d")
-    )
-    rewards_by_token = rewards_by_token.merge(
-        price_df[["price", "Symbol", "Date"]],
-        left_on=["symbol", "Date"],
-        right_on=["Symbol", "Date"],
-        how="left",
-    )
-    rewards_by_token["Amount (USD)"] = (
-        rewards_by_token["Total Amount"] * rewards_by_token["price"]
+    return normalize_flows(
+        dfs["reward_claims_by_token"],
+        ft,
+        "TOKEN_ID",
+        [FlowAmount("Total Amount", "Total Amount", "Amount (USD)")],
     )
-    return rewards_by_token
 
 
-@st.cache(ttl=(3600 * 12))
+@cached("transform", ttl=(3600 * 12), hash_funcs=FINGERPRINT_HASH_FUNCS)
 def get_pool_deposit_withdraws(dfs, ft):
-    pool_deposit_withdraws = dfs["pool_deposit_withdraws"]
-
-    token_conversions = get_decimals(pool_deposit_withdraws.TOKEN, ft)
-    pool_deposit_withdraws = pool_deposit_withdraws.merge(
-        token_conversions,
-        left_on="TOKEN",
-        right_on="token_account_id",
-    )
-    pool_deposit_withdraws["token_id"] = pool_deposit_withdraws.TOKEN
-    pool_deposit_withdraws["Date"] = pd.to_datetime(pool_deposit_withdraws.Date)
-    pool_deposit_withdraws["Raw Total Amount"] = pd.to_numeric(
-        pool_deposit_withdraws["Total Token Amount"]
-    )
-    pool_deposit_withdraws["Total Amount"] = (
-        pool_deposit_withdraws["Raw Total Amount"]
-        / pool_deposit_withdraws["conversion_factor"]
-    )
-    pool_deposit_withdraws["Raw Average Amount"] = pd.to_numeric(
-        pool_deposit_withdraws["Average Average Token Amount"]
-    )
-    pool_deposit_withdraws["Average Amount"] = (
-        pool_deposit_withdraws["Raw Average Amount"]
-        / pool_deposit_withdraws["conversion_factor"]
+    return normalize_flows(
+        dfs["pool_deposit_withdraws"],
+        ft,
+        "TOKEN",
+        [
+            FlowAmount("Total Token Amount", "Total Amount", "Amount (USD)"),
+            FlowAmount(
+                "Average Average Token Amount", "Average Amount", "Average Amount (USD)"
+            ),
+        ],
     )
 
-    price_df = get_price_df(
-        pool_deposit_withdraws.symbol.unique(), pool_deposit_withdraws
-    )
-    price_df["Date"] = pd.to_datetime(
-        pd.to_datetime(price_df.date).dt.strftime("%Y-%m-%d")
-    )
-    pool_deposit_withdraws = pool_deposit_withdraws.merge(
-        price_df[["price", "Symbol", "Date"]],
-        left_on=["symbol", "Date"],
-        right_on=["Symbol", "Date"],
-        how="left",
-    )
-    pool_deposit_withdraws["Amount (USD)"] = (
-        pool_deposit_withdraws["Total Amount"] * pool_deposit_withdraws["price"]
-    )
-    pool_deposit_withdraws["Average Amount (USD)"] = (
-        pool_deposit_withdraws["Average Amount"] * pool_deposit_withdraws["price"]
-    )
-    return pool_deposit_withdraws
+
+class LiquidityCube:
+    """Pool deposits and withdrawals summed by (Date, POOL_ID, Symbol, ACTION_TYPE)
+
+    Each cell holds the sum and count of every metric, so averages and totals
+    over any combination of these keys are computed from the cube instead of
+    the full table. Built once per data refresh (see :func:`liquidity_cube`).
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Output of :func:`get_pool_deposit_withdraws`
+    """
+
+    keys = ["Date", "POOL_ID", "Symbol", "ACTION_TYPE"]
+    metrics = [
+        "Total Actions",
+        "Total Amount",
+        "Average Amount",
+        "Amount (USD)",
+        "Average Amount (USD)",
+    ]
+
+    def __init__(self, df: pd.DataFrame):
+        values = df[self.metrics].apply(pd.to_numeric, errors="coerce")
+        grouped = values.groupby([df[k] for k in self.keys], observed=True)
+        cube = grouped.sum().join(grouped.count(), rsuffix=" (count)")
+        cube["name"] = df.groupby(self.keys, observed=True)["name"].first()
+        cube = cube.reset_index()
+        # Withdrawals are plotted below zero
+        cube["sign"] = np.where(cube.ACTION_TYPE == "remove", -1, 1)
+        self.cube = cube
+
+        rows = df.sort_values(by="Date", kind="stable")
+        self.pools = sorted(cube.POOL_ID.unique())
+        self.pool_symbols = (
+            rows.drop_duplicates(["POOL_ID", "Symbol"])
+            .groupby("POOL_ID", observed=True)["Symbol"]
+            .agg(list)
+            .to_dict()
+        )
+        self.token_names = (
+            df.drop_duplicates("Symbol").set_index("Symbol")["name"].to_dict()
+        )
+
+    def __len__(self):
+        return len(self.cube)
+
+    def aggregate(
+        self, rows: pd.DataFrame, by, metric: str, agg="mean", signed=False
+    ) -> pd.Series:
+        """Mean (or total, with ``agg="sum"``) of ``metric`` over cube ``rows`` grouped ``by``
+
+        With ``signed``, withdrawals are negated; ``by`` must then include
+        ACTION_TYPE.
+        """
+        if signed:
+            rows = rows.assign(**{metric: rows[metric] * rows["sign"]})
+        totals = rows.groupby(by, observed=True)[[metric, f"{metric} (count)"]].sum()
+        if agg == "sum":
+            return totals[metric]
+        return (totals[metric] / totals[f"{metric} (count)"]).rename(metric)
+
+    def by_date(self, col: str, value, metric: str, date_range=None):
+        """Daily ``metric`` per action type of a pool or token, and action types by mean
+
+        Withdrawals are negated. Pools are averaged over their tokens, and get
+        a ``Symbol`` and ``name`` made from their tokens. Tokens keep one row
+        per pool; :func:`alt_pool_liquidity` sums those pools for each day.
+        """
+        rows = self.cube[self.cube[col] == value]
+        if type(date_range) == int:
+            today = datetime.today()
+            rows = rows[rows.Date >= pd.to_datetime(today - timedelta(days=date_range))]
+        if col == "POOL_ID":
+            df = self.aggregate(
+                rows, ["Date", "ACTION_TYPE"], metric, signed=True
+            ).reset_index()
+            present = set(rows.Symbol)
+            symbols = [x for x in self.pool_symbols.get(value, []) if x in present]
+            df["Symbol"] = "-".join(symbols)
+            df["name"] = f"{'/ '.join(symbols)} LP"
+        else:
+            df = rows[self.keys + ["name"]].copy()
+            df[metric] = rows[metric] * rows["sign"] / rows[f"{metric} (count)"]
+        df = df.sort_values(by="Date", kind="stable").reset_index(drop=True)
+        columns = (
+            self.aggregate(rows, "ACTION_TYPE", metric)
+            .sort_values(ascending=False)
+            .index.to_list()
+        )
+        return df, columns
+
+    def top(self, col: str, metric: str, agg: str, n: int) -> pd.DataFrame:
+        """``metric`` per action type of the ``n`` pools or tokens with the largest ``agg``"""
+        items = (
+            self.aggregate(self.cube, col, metric, agg)
+            .sort_values(ascending=False)[:n]
+            .index
+        )
+        rows = self.cube[self.cube[col].isin(items)]
+        by = list(dict.fromkeys([col, "ACTION_TYPE", "Symbol", "name"]))
+        return self.aggregate(rows, by, metric, agg, signed=True).reset_index()
+
+
+@cached("transform", allow_output_mutation=True, hash_funcs=FINGERPRINT_HASH_FUNCS)
+def liquidity_cube(df: pd.DataFrame) -> LiquidityCube:
+    return LiquidityCube(df)
+
+
+STABLE_TOP_USERS = 100
+
+
+@cached("transform", allow_output_mutation=True, hash_funcs=FINGERPRINT_HASH_FUNCS)
+def stablecoin_rankings(df: pd.DataFrame, n=STABLE_TOP_USERS) -> dict:
+    """Top ``n`` users of each stablecoin (by ``ROW_NUMBER``), keyed by symbol"""
+    df = df[df.ROW_NUMBER <= n].sort_values(["Symbol", "ROW_NUMBER"])
+    return {
+        str(k): x.reset_index(drop=True) for k, x in df.groupby("Symbol", observed=True)
+    }
+
+
+# Daily volume of each stablecoin, kept on disk and extended with the new days
+# of each refresh of ``stablecoin_tx``. The query already has one row per day
+# and symbol, so it has no transfer count to aggregate.
+stablecoin_daily = DailyRollup(
+    "stablecoin_daily",
+    date_col="Date",
+    keys=["Symbol"],
+    aggs={"Volume": ("Total Amount", "sum")},
+)
+
+
+@instrument()
+def get_stablecoin_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """Daily volume of each stablecoin in ``stablecoin_tx``"""
+    return stablecoin_daily.update(df)
 
 
 # Charting
-def alt_date_area(df, value, title, date_range, val_format="", color="black"):
+@instrument("chart")
+def alt_date_area(
+    df, value, title, date_range, val_format="", color="black", max_points=MAX_POINTS
+):
     if type(date_range) == int:
         df = df.iloc[-date_range:]
+    df = downsample_area(df, "date", value, max_points=max_points)
     chart = (
         alt.Chart(df)
         .mark_area(color=color)
@@ -346,29 +757,27 @@ def alt_date_area(df, value, title, date_range, val_format="", color="black"):
     return chart
 
 
+@instrument("chart")
 def alt_date_line(
-    token_list,
-    base_df,
+    df,
     value,
     title,
-    date_range,
     val_format="",
     color_col="token",
     is_stable=False,
+    max_points=MAX_POINTS,
 ):
-    df = get_price_df(token_list, base_df)
-    df = df.sort_values(by="date")
-    if type(date_range) == int:
-        df = df.iloc[-date_range:]
+    df = downsample_line(df, "date", value, by=color_col, max_points=max_points)
     if is_stable:
         scale = alt.Scale(zero=False, domain=[0.8, 1.2], nice=False)
     else:
         scale = alt.Scale(zero=False, nice=False)
 
-    base = alt.Chart(df).encode(
+    wide, columns = pivot_wide(df, "date", color_col, value)
+    columns = sorted(columns)
+    base = alt.Chart(wide).encode(
         x=alt.X("yearmonthdate(date):T", axis=alt.Axis(title=""))
     )
-    columns = sorted(df[color_col].unique())
     selection = alt.selection_single(
         fields=["date"],
         nearest=True,
@@ -376,25 +785,31 @@ def alt_date_line(
         empty="none",
         clear="mouseout",
     )
-    lines = base.mark_line().encode(
-        y=alt.Y(
-            f"{value}:Q",
-            title=title,
-            scale=scale,
-        ),
-        color=alt.Color(color_col, title=color_col.title()),
+    lines = (
+        base.transform_fold(
+            [escape_field(c) for c in columns], as_=[color_col, value]
+        )
+        .mark_line()
+        .encode(
+            y=alt.Y(
+                f"{value}:Q",
+                title=title,
+                scale=scale,
+            ),
+            color=alt.Color(f"{color_col}:N", title=color_col.title()),
+        )
     )
     points = lines.mark_point().transform_filter(selection)
     rule = (
-        base.transform_pivot(color_col, value=value, groupby=["date"])
-        .mark_rule()
+        base.mark_rule()
         .encode(
             opacity=alt.condition(selection, alt.value(0.3), alt.value(0)),
             tooltip=[alt.Tooltip("yearmonthdate(date):T", title="Date")]
             + [
                 alt.Tooltip(
-                    c,
+                    escape_field(c),
                     type="quantitative",
+                    title=c,
                     format=val_format,
                 )
                 for c in columns
@@ -407,6 +822,7 @@ def alt_date_line(
     return chart.properties(height=500).interactive()
 
 
+@instrument("chart")
 def alt_symbol_bar(df, metric, num, analysis_type, var):
     df = df.sort_values(by=metric, ascending=False).iloc[:num].reset_index(drop=True)
 
@@ -442,6 +858,7 @@ def alt_symbol_bar(df, metric, num, analysis_type, var):
     return chart
 
 
+@instrument("chart")
 def alt_lp_bar(df, pool_name):
     chart = (
         alt.Chart(df, title=pool_name)
@@ -474,6 +891,7 @@ def alt_lp_bar(df, pool_name):
     return chart
 
 
+@instrument("chart")
 def alt_farm_claims_bar(df):
     chart = (
         alt.Chart(df, title=f"Reward Claims per Day")
@@ -502,6 +920,7 @@ def alt_farm_claims_bar(df):
     return chart
 
 
+@instrument("chart")
 def alt_farm_bar(df, pool_name):
     chart = (
         alt.Chart(df, title=pool_name)
@@ -531,6 +950,7 @@ def alt_farm_bar(df, pool_name):
     return chart
 
 
+@instrument("chart")
 def alt_farm_reward_claims(df):
     chart = (
         alt.Chart(df, title=f"Reward Claims per Day")
@@ -559,25 +979,30 @@ def alt_farm_reward_claims(df):
     return chart
 
 
+@instrument("chart")
 def alt_farm_date_line(
     df,
     value,
     date_range,
     val_format="",
     color_col="name",
+    max_points=MAX_POINTS,
 ):
     df = df.sort_values(by="Date")
     if type(date_range) == int:
         today = datetime.today()
         date_diff = pd.to_datetime(today - timedelta(days=date_range))
         df = df[df.Date >= date_diff]
+    df = downsample_line(df, "Date", value, by=color_col, max_points=max_points)
 
-    base = alt.Chart(df, title="Reward Amount Claimed per Day (in USD)").encode(
-        x=alt.X("yearmonthdate(Date):T", axis=alt.Axis(title=""))
-    )
+    wide, _ = pivot_wide(df, "Date", color_col, value)
     columns = (
         df.groupby(color_col)[value].mean().sort_values(ascending=False).index.to_list()
     )
+    columns = [str(x) for x in columns]
+    base = alt.Chart(wide, title="Reward Amount Claimed per Day (in USD)").encode(
+        x=alt.X("yearmonthdate(Date):T", axis=alt.Axis(title=""))
+    )
     selection = alt.selection_single(
         fields=["Date"],
         nearest=True,
@@ -585,27 +1010,33 @@ def alt_farm_date_line(
         empty="none",
         clear="mouseout",
     )
-    lines = base.mark_line().encode(
-        y=alt.Y(
-            f"{value}:Q",
-        ),
-        color=alt.Color(
-            color_col,
-            title=color_col.title(),
-            sort=alt.EncodingSortField("Amount (USD)", op="max", order="descending"),
-        ),
+    lines = (
+        base.transform_fold(
+            [escape_field(c) for c in columns], as_=[color_col, value]
+        )
+        .mark_line()
+        .encode(
+            y=alt.Y(
+                f"{value}:Q",
+            ),
+            color=alt.Color(
+                f"{color_col}:N",
+                title=color_col.title(),
+                sort=alt.EncodingSortField(value, op="max", order="descending"),
+            ),
+        )
     )
     points = lines.mark_point().transform_filter(selection)
     rule = (
-        base.transform_pivot(color_col, value=value, groupby=["Date"])
-        .mark_rule()
+        base.mark_rule()
         .encode(
             opacity=alt.condition(selection, alt.value(0.3), alt.value(0)),
             tooltip=[alt.Tooltip("yearmonthdate(Date):T", title="Date")]
             + [
                 alt.Tooltip(
-                    c,
+                    escape_field(c),
                     type="quantitative",
+                    title=c,
                     format=val_format,
                 )
                 for c in columns
@@ -618,6 +1049,7 @@ def alt_farm_date_line(
     return chart.properties(height=500).interactive()
 
 
+@instrument("chart")
 def alt_reward_bar(df, token_name):
     chart = (
         alt.Chart(df, title=f"Top 20 claimers: {token_name}")
@@ -660,38 +1092,23 @@ def alt_reward_bar(df, token_name):
     return chart
 
 
-def alt_pool_liquidity(df, analysis_type, metric, grouping, date_range, s):
+@instrument("chart")
+def alt_pool_liquidity(cube, analysis_type, metric, grouping, date_range, s):
+    if isinstance(cube, pd.DataFrame):
+        cube = liquidity_cube(cube)
     if analysis_type == "By Pool":
         col = "POOL_ID"
     if analysis_type == "By Token":
         col = "Symbol"
     if grouping == "By Date":
-        df = df.sort_values(by="Date")
-        if type(date_range) == int:
-            today = datetime.today()
-            date_diff = pd.to_datetime(today - timedelta(days=date_range))
-            df = df[df.Date >= date_diff]
-        df = df[df[col] == s]
-        if analysis_type == "By Pool":
-            grouped_df = (
-                df.groupby(["Date", "ACTION_TYPE"])[metric].mean().reset_index()
-            )
-            grouped_df["Symbol"] = "-".join(df.Symbol.unique())
-            grouped_df["name"] = f"{'/ '.join(df.Symbol.unique())} LP"
-        else:
-            grouped_df = df
-        grouped_df[metric] = grouped_df.apply(
-            lambda x: x[metric] * -1 if x.ACTION_TYPE == "remove" else x[metric], axis=1
+        grouped_df, columns = cube.by_date(col, s, metric, date_range)
+        wide, _ = pivot_wide(
+            grouped_df, ["Date", "Symbol", "name"], "ACTION_TYPE", metric
         )
+        columns = [str(x) for x in columns]
         base = alt.Chart(
-            grouped_df, title=f"{metric}, {grouping}, {analysis_type}: {s}"
+            wide, title=f"{metric}, {grouping}, {analysis_type}: {s}"
         ).encode(x=alt.X("yearmonthdate(Date):T", axis=alt.Axis(title="")))
-        columns = (
-            df.groupby("ACTION_TYPE")[metric]
-            .mean()
-            .sort_values(ascending=False)
-            .index.to_list()
-        )
         selection = alt.selection_single(
             fields=["Date"],
             nearest=True,
@@ -699,22 +1116,25 @@ def alt_pool_liquidity(df, analysis_type, metric, grouping, date_range, s):
             empty="none",
             clear="mouseout",
         )
-        lines = base.mark_line(interpolate="monotone").encode(
-            y=alt.Y(
-                f"{metric}:Q",
-            ),
-            color=alt.Color(
-                "ACTION_TYPE",
-                title="Action Type",
-                # sort=alt.EncodingSortField("Amount (USD)", op="max", order="descending"),
-            ),
+        lines = (
+            base.transform_fold(
+                [escape_field(c) for c in columns], as_=["ACTION_TYPE", metric]
+            )
+            .mark_line(interpolate="monotone")
+            .encode(
+                y=alt.Y(
+                    f"{metric}:Q",
+                ),
+                color=alt.Color(
+                    "ACTION_TYPE:N",
+                    title="Action Type",
+                    # sort=alt.EncodingSortField("Amount (USD)", op="max", order="descending"),
+                ),
+            )
         )
         points = lines.mark_point().transform_filter(selection)
         rule = (
-            base.transform_pivot(
-                "ACTION_TYPE", value=metric, groupby=["Date", "Symbol", "name"]
-            )
-            .mark_rule()
+            base.mark_rule()
             .encode(
                 opacity=alt.condition(selection, alt.value(0.3), alt.value(0)),
                 tooltip=[
@@ -724,8 +1144,9 @@ def alt_pool_liquidity(df, analysis_type, metric, grouping, date_range, s):
                 ]
                 + [
                     alt.Tooltip(
-                        c,
+                        escape_field(c),
                         type="quantitative",
+                        title=c,
                     )
                     for c in columns
                 ],
@@ -739,16 +1160,7 @@ def alt_pool_liquidity(df, analysis_type, metric, grouping, date_range, s):
             agg = "mean"
         if grouping == "Daily Total":
             agg = "sum"
-        items = df.groupby(col)[metric].agg(agg).sort_values(ascending=False)[:s].index
-        grouped_df = (
-            df[df[col].isin(items)]
-            .groupby([col, "ACTION_TYPE", "Symbol", "name"])[metric]
-            .agg(agg)
-            .reset_index()
-        )
-        grouped_df[metric] = grouped_df.apply(
-            lambda x: x[metric] * -1 if x.ACTION_TYPE == "remove" else x[metric], axis=1
-        )
+        grouped_df = cube.top(col, metric, agg, s)
         chart = (
             alt.Chart(grouped_df, title=f"{metric}, {grouping}, {analysis_type}")
             .mark_bar()
@@ -779,6 +1191,28 @@ def alt_pool_liquidity(df, analysis_type, metric, grouping, date_range, s):
     return chart.interactive().properties(height=800)
 
 
+@instrument("chart")
+def alt_stable_volume(df):
+    chart = (
+        alt.Chart(df, title="Daily Stablecoin Volume")
+        .mark_bar()
+        .encode(
+            x=alt.X("yearmonthdate(date):T", title=None),
+            y=alt.Y("Volume:Q", title="Volume", stack=True),
+            color=alt.Color("Symbol", scale=alt.Scale(scheme="tableau20")),
+            tooltip=[
+                alt.Tooltip("yearmonthdate(date):T", title="Date"),
+                alt.Tooltip("Symbol"),
+                alt.Tooltip("Volume", format=",.0f"),
+            ],
+        )
+        .interactive()
+        .properties(height=500)
+    )
+    return chart
+
+
+@instrument("chart")
 def alt_stable_user(df):
     chart = (
         alt.Chart(df)
@@ -1,9 +1,8 @@
-from functools import partial
-
 import pandas as pd
 import streamlit as st
 
 from fin_utils import *
+from common.instrument import show_panel
 
 st.set_page_config(
     page_title="Citizens of NEAR: Financial District", page_icon="🌆", layout="wide"
@@ -41,7 +40,21 @@ st.header("Central Bank of NEAR")
 
 Let's take a look at some of its metrics:
 """
-ref_data = get_ref_data()
+ref_data = get_ref_data(
+    [
+        "volume_variation_24h",
+        "ft",
+        "historical_tvl_all",
+        "top_pools",
+        "top_tokens",
+        "volume_24h_all",
+        "pool_number",
+        "active_pool_number",
+        "all_pairs",
+        "all_farms",
+        "last_farming_stats",
+    ]
+)
 date_range = st.radio(
     "Date range for charts:",
     ["All", 7, 30, 60, 90],
@@ -49,9 +62,6 @@ date_range = st.radio(
     horizontal=True,
 )
 tvl = ref_data["historical_tvl_all"]["df"].copy()
-tvl["date"] = tvl["historicalTVL"].map(lambda x: pd.to_datetime(x["date"]))
-tvl["totalUsdTvl"] = tvl["historicalTVL"].map(lambda x: x["totalUsdTvl"])
-tvl["usdNear"] = tvl["historicalTVL"].map(lambda x: x["usdNear"])
 latest_tvl = tvl.iloc[-1]
 tvl = tvl.drop(index=len(tvl) - 1)
 tvl_chart = alt_date_area(
@@ -64,7 +74,6 @@ tvl_chart = alt_date_area(
 )
 
 vol = ref_data["volume_24h_all"]["df"].copy()
-vol["date"] = pd.to_datetime(vol["date"])
 latest_vol = ref_data["volume_variation_24h"]["data"]
 vol_chart = alt_date_area(
     vol,
@@ -106,19 +115,17 @@ ft = ref_data["ft"]["df"].copy()
 dfs = load_data()
 
 tokens = ref_data["top_tokens"]["df"].copy()
-tokens["Current TVL"] = pd.to_numeric(tokens.tvl)
-tokens["24h Volume"] = pd.to_numeric(tokens.volume24h)
-tokens["price"] = pd.to_numeric(tokens.price)
+tokens["Current TVL"] = tokens.tvl
+tokens["24h Volume"] = tokens.volume24h
 tokens["is_stablecoin"] = tokens.symbol.isin(["USDC", "USDT", "USN", "cUSD", "DAI"])
 tokens["is_btc"] = tokens.symbol.isin(["WBTC", "HBTC"])
 tokens["is_near"] = tokens.symbol.isin(["wNEAR", "STNEAR", "NearX", "LINEAR"])
 
 
 pools = ref_data["top_pools"]["df"].copy()
-pools["Current TVL"] = pd.to_numeric(pools.tvl)
-pools["24h Volume"] = pd.to_numeric(pools.volume24hinUSD)
-get_pair = partial(get_pair_from_token_id, df=ft)
-pools["Pair"] = pools.token_account_ids.apply(get_pair)
+pools["Current TVL"] = pools.tvl
+pools["24h Volume"] = pools.volume24hinUSD
+pools["Pair"] = token_registry(ft).pair_names(pools.token_account_ids)
 pools = pools[
     [
         "Pair",
@@ -129,6 +136,7 @@ pools = pools[
         "24h Volume",
     ]
 ]
+prefetch_holders(pools, ref_data["all_farms"]["df"])
 
 c1, c2 = st.columns([1, 3])
 
@@ -169,11 +177,9 @@ pool_id = c1.selectbox(
 pool_df = pools[pools.pool_id == pool_id]
 pool_name = f"{pool_id}: {pool_df.iloc[0]['Pair']}"
 lp_info = get_lp(pool_id)
-lp_created_at = lp_info["pool"]["createdAt"]
-lp_shares = pd.DataFrame(lp_info["pool"]["shares"])
-lp_shares["Value (USD)"] = pool_df.iloc[0]["Current TVL"] * pd.to_numeric(
-    lp_shares.prct
-)
+lp_created_at = lp_info["created_at"]
+lp_shares = lp_info["holders"].copy()
+lp_shares["Value (USD)"] = pool_df.iloc[0]["Current TVL"] * lp_shares.prct
 
 c1.metric(
     "Curent Total Value Locked (TVL)",
@@ -183,6 +189,8 @@ c1.metric(
     "Trade Volume, past 24 hours",
     f"${pool_df.iloc[0]['24h Volume']:,.0f}",
 )
+c1.metric("Share of top 10 LPs", f"{lp_info['top_10_share']:.1%}")
+c1.metric("LP Gini Coefficient", f"{lp_info['gini']:.3f}")
 c2.altair_chart(alt_lp_bar(lp_shares, pool_name), use_container_width=True)
 
 st.write(
@@ -196,25 +204,7 @@ Choose whether you want to look at:
 )
 c1, c2 = st.columns([1, 3])
 pool_deposit_withdraws = get_pool_deposit_withdraws(dfs, ft)
-deposit_withdraws_subset = pool_deposit_withdraws.copy()[
-    [
-        "Date",
-        "POOL_ID",
-        "Symbol",
-        "name",
-        "ACTION_TYPE",
-        "price",
-        "Total Actions",
-        "Total Amount",
-        "Average Amount",
-        "Amount (USD)",
-        "Average Amount (USD)",
-    ]
-]
-deposit_withdraws_subset["Total Actions"] = pd.to_numeric(
-    deposit_withdraws_subset["Total Actions"]
-)
-deposit_withdraws_subset["POOL_ID"] = pd.to_numeric(deposit_withdraws_subset["POOL_ID"])
+pool_liquidity = liquidity_cube(pool_deposit_withdraws)
 
 analysis_type = c1.radio(
     "How do you want to view the data?", ["By Pool", "By Token"], horizontal=True
@@ -248,14 +238,14 @@ if grouping == "By Date":
     if analysis_type == "By Pool":
         selection = c1.selectbox(
             "Choose a pool",
-            sorted(pd.to_numeric(deposit_withdraws_subset["POOL_ID"]).unique()),
+            pool_liquidity.pools,
             key="pool_deposits_pool",
         )
     if analysis_type == "By Token":
         selection = c1.selectbox(
             "Choose a token",
-            deposit_withdraws_subset["Symbol"].unique(),
-            format_func=lambda x: f"{deposit_withdraws_subset[deposit_withdraws_subset['Symbol'] == x]['name'].values[0]} ({x})",
+            list(pool_liquidity.token_names),
+            format_func=lambda x: f"{pool_liquidity.token_names[x]} ({x})",
             key="pool_deposits_token",
         )
 else:
@@ -271,7 +261,7 @@ else:
 
 c2.altair_chart(
     alt_pool_liquidity(
-        deposit_withdraws_subset, analysis_type, metric, grouping, date_range, selection
+        pool_liquidity, analysis_type, metric, grouping, date_range, selection
     ),
     use_container_width=True,
 )
@@ -322,39 +312,31 @@ stable_list = tokens[tokens.is_stablecoin].symbol.to_list()
 btc_list = tokens[tokens.is_btc].symbol.to_list()
 
 price_chart = alt_date_line(
-    [token_list],
-    tokens,
+    get_price_series([token_list], tokens, date_range_1),
     "price",
     title="Price (USD)",
-    date_range=date_range_1,
     color_col="Symbol",
     val_format=",.2f",
 )
 near_chart = alt_date_line(
-    near_list,
-    tokens,
+    get_price_series(near_list, tokens, date_range_2),
     "price",
     title="Price (USD)",
-    date_range=date_range_2,
     color_col="Symbol",
     val_format=",.2f",
 )
 stable_chart = alt_date_line(
-    stable_list,
-    tokens,
+    get_price_series(stable_list, tokens, date_range_3),
     "price",
     title="Price (USD)",
-    date_range=date_range_3,
     color_col="Symbol",
     val_format=",.2f",
     is_stable=True,
 )
 btc_chart = alt_date_line(
-    btc_list,
-    tokens,
+    get_price_series(btc_list, tokens, date_range_4),
     "price",
     title="Price (USD)",
-    date_range=date_range_4,
     color_col="Symbol",
     val_format=",.2f",
 )
@@ -381,7 +363,6 @@ latest_farm = ref_data["last_farming_stats"]["df"].iloc[0]
 all_farms = ref_data["all_farms"]["df"].copy()
 
 reward_claims = dfs["reward_claims"].copy()
-reward_claims["Reward Claims"] = pd.to_numeric(reward_claims["Reward Claims"])
 reward_claims["Farm ID"] = reward_claims.FARM_ID.str.split("#", expand=True)[0]
 reward_claims = (
     reward_claims.groupby(["Farm ID", "Date"])["Reward Claims"].sum().reset_index()
@@ -397,24 +378,17 @@ reward_claims = reward_claims.merge(total_claims, on="Date")
 rewards_by_token = get_rewards_by_token(dfs, ft)
 
 
-reward_claims_by_user = dfs["reward_claims_by_user"]
-token_conversions = get_decimals(reward_claims_by_user.TOKEN_ID, ft)
-reward_claims_by_user = reward_claims_by_user.merge(
-    token_conversions,
-    left_on="TOKEN_ID",
-    right_on="token_account_id",
-)
-reward_claims_by_user["Raw Total Amount"] = pd.to_numeric(
-    reward_claims_by_user["Total Amount"]
-)
-reward_claims_by_user["Total Amount"] = (
-    reward_claims_by_user["Raw Total Amount"]
-    / reward_claims_by_user["conversion_factor"]
+reward_claims_by_user = normalize_flows(
+    dfs["reward_claims_by_user"],
+    ft,
+    "TOKEN_ID",
+    [FlowAmount("Total Amount", "Total Amount")],
+    date_col=None,
 )
 
 
 c1, c2 = st.columns([1, 3])
-c1.metric("Total Farms", latest_farm.farm_count)
+c1.metric("Total Farms", f"{int(latest_farm.farm_count):,}")
 c1.metric("Total Farmers", f"{int(latest_farm.farmer_count):,}")
 c1.metric("Overall Farming Reward Rate", f"{int(latest_farm.reward_count)}%")
 
@@ -466,10 +440,9 @@ c1.write(
 farm_df = all_farms[all_farms.farm_id == farm_id]
 # farm_name = f"{pool_id}: {farm_df.iloc[0]['Pair']}"
 farm_info = get_accounts(farm_id)
-farm_accounts = pd.DataFrame(farm_info["accounts"])
-farm_accounts = pd.concat(
-    [farm_accounts, pd.json_normalize(farm_accounts["accounts"])], axis=1
-)
+farm_accounts = farm_info["holders"]
+c1.metric("Share of top 10 farmers", f"{farm_info['top_10_share']:.1%}")
+c1.metric("Farm Gini Coefficient", f"{farm_info['gini']:.3f}")
 c2.altair_chart(alt_farm_bar(farm_accounts, farm_id), use_container_width=True)
 
 st.header("Stablecoins")
@@ -480,18 +453,21 @@ NEAR users are also fans of stable assets. We tracked the largest stablecoin hol
 **Caveat**: this data does not contain history from the beginning of the NEAR blockchain, so analysis will not be fully accurate.
     """
 )
-stablecoin_top_users = dfs["stablecoin_top_users"].copy()
+stablecoin_top_users = stablecoin_rankings(dfs["stablecoin_top_users"])
 c1, c2 = st.columns([1, 3])
 num = c1.slider("Number of Tokens / Pools:", 1, 100, 20, key="stable_num")
 coin = c1.selectbox(
     "Choose a stablecoin",
-    pd.unique(sorted(stablecoin_top_users["Symbol"])),
+    list(stablecoin_top_users),
     key="stable_coin_select",
 )
 
-df = stablecoin_top_users
-df["row"] = pd.to_numeric(df["ROW_NUMBER"])
-df["Total Amount"] = pd.to_numeric(df["Total Amount"])
-df = df[(df.Symbol == coin) & (df["row"] <= num)]
+df = stablecoin_top_users[coin]
+df = df[df["ROW_NUMBER"] <= num]
 
 c2.altair_chart(alt_stable_user(df), use_container_width=True)
+
+stablecoin_volume = get_stablecoin_daily(dfs["stablecoin_tx"])
+st.altair_chart(alt_stable_volume(stablecoin_volume), use_container_width=True)
+
+show_panel()
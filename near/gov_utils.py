@@ -1,6 +1,13 @@
+import copy
+import logging
+import sys
+import threading
+import time
 from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, NamedTuple, Optional
 from datetime import datetime
-from typing import Iterable, Union
+from pathlib import Path
 
 import altair as alt
 import numpy as np
@@ -9,11 +16,21 @@ import requests
 import streamlit as st
 from shroomdk import ShroomDK
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.charts import escape_field
+from common.data_cache import entry_lock, read_frame, read_queries, write_frame
+from common.fetch import MAX_WORKERS, TIMEOUT, Endpoint, FetchPlan, session
+from common.instrument import cached, instrument
+from common.stats import gini
+from common.yocto import convert_to_near
+
 fs_key = st.secrets["flipside"]["api_key"]
 fig_key = st.secrets["figment"]["api_key"]
 fig_url = f"https://near--indexer.datahub.figment.io/apikey/{fig_key}"
 sdk = ShroomDK(fs_key)
 
+logger = logging.getLogger(__name__)
+
 __all__ = [
     "get_blocktimes",
     "get_status",
@@ -22,6 +39,10 @@ __all__ = [
     "get_validators",
     "get_validator_epochs",
     "get_account_info",
+    "StakeMatrix",
+    "backfill_stake_matrix",
+    "get_stake_matrix",
+    "network_stake_history",
     "query_information",
     "load_data",
     "validator_column_mappings",
@@ -30,66 +51,36 @@ __all__ = [
     "get_fs_validator_data",
     "alt_lines_bar",
     "alt_scatter",
+    "alt_network_line",
 ]
 
 
-def convert_to_near(yNEAR: Union[str, Iterable]) -> float:
-    if type(yNEAR) == str:
-        return int(yNEAR) / 10**24
-    else:
-        return [int(x) / 10**24 for x in yNEAR]
-
-
-@st.cache(ttl=60)
-def get_blocktimes() -> dict:
-    url = f"{fig_url}/block_times"
-    r = requests.get(url, params={"limit": 1000})
-    data = r.json()
-    return data
-
-
-@st.cache(ttl=60)
-def get_status() -> dict:
-    url = f"{fig_url}/status"
-    r = requests.get(url)
-    data = r.json()
-    return data
+# Figment indexer snapshots. Every session reads the same few endpoints, so a
+# background poller refreshes each one once per FIGMENT_TTL, starting with the
+# first call of its getter, and sessions are served the last good snapshot.
+FIGMENT_TTL = 60
+figment_endpoints = {
+    "block_times": Endpoint(f"{fig_url}/block_times", FIGMENT_TTL, {"limit": 1000}),
+    "status": Endpoint(f"{fig_url}/status", FIGMENT_TTL),
+    "blocks": Endpoint(f"{fig_url}/blocks", FIGMENT_TTL, {"limit": 100}),
+    "epochs": Endpoint(f"{fig_url}/epochs", FIGMENT_TTL),
+    "validators": Endpoint(f"{fig_url}/validators", FIGMENT_TTL),
+}
 
 
-@st.cache(ttl=60)
-def get_account_info(address: str) -> dict:
-    url = f"{fig_url}/accounts/{address}"
-    r = requests.get(url)
-    data = r.json()
+def _account_info(data: dict) -> dict:
     data["Staked Amount (NEAR)"] = convert_to_near(data["staked_amount"])
     data["Balance (NEAR)"] = convert_to_near(data["amount"])
     return data
 
 
-@st.cache(ttl=60)
-def get_blocks() -> pd.DataFrame:
-    url = f"{fig_url}/blocks"
-    r = requests.get(url, params={"limit": 100})
-    data = r.json()
+def _blocks(data: list) -> pd.DataFrame:
     df = pd.DataFrame(data)
     df["Total Supply (NEAR)"] = convert_to_near(df.total_supply)
     return df
 
 
-@st.cache(ttl=60)
-def get_epochs() -> pd.DataFrame:
-    url = f"{fig_url}/epochs"
-    r = requests.get(url)
-    data = r.json()
-    df = pd.DataFrame(data)
-    return df
-
-
-@st.cache(ttl=60)
-def get_validators() -> pd.DataFrame:
-    url = f"{fig_url}/validators"
-    r = requests.get(url)
-    data = r.json()
+def _validators(data: list) -> pd.DataFrame:
     df = pd.DataFrame(data)
     df["Stake (NEAR)"] = convert_to_near(df.stake)
     df["last_time"] = pd.to_datetime(df["last_time"])
@@ -111,21 +102,116 @@ def get_validators() -> pd.DataFrame:
     return new_df
 
 
-@st.cache(ttl=60)
-def get_validator_epochs(validator: str) -> pd.DataFrame:
-    url = f"{fig_url}/validators/{validator}/epochs"
-    data = []
-    r = requests.get(url)
-    p1 = r.json()
-    data.extend(p1["records"])
-    pages = p1["pages"]
-    if pages > 1:
-        for i in range(2, pages + 1):
-            r = requests.get(url, params={"page": i})
-            p1 = r.json()
-            data.extend(p1["records"])
+_figment_parsers = {
+    "accounts": _account_info,
+    "blocks": _blocks,
+    "epochs": pd.DataFrame,
+    "validators": _validators,
+}
 
-    df = pd.DataFrame(data)
+
+def _parse_figment(name: str, r: requests.Response):
+    parse = _figment_parsers.get(name.split("/")[0])
+    data = r.json()
+    return data if parse is None else parse(data)
+
+
+figment_plan = FetchPlan(figment_endpoints, parse=_parse_figment)
+
+
+def _figment_snapshot(name: str):
+    figment_plan.poll([name])
+    # Every session shares the snapshot, so each caller gets its own copy
+    return copy.deepcopy(figment_plan.fetch([name])[name])
+
+
+@instrument("load")
+def get_blocktimes() -> dict:
+    return _figment_snapshot("block_times")
+
+
+@instrument("load")
+def get_status() -> dict:
+    return _figment_snapshot("status")
+
+
+# Accounts are looked up on demand rather than polled: concurrent requests for
+# an address share one download, its result is reused for FIGMENT_TTL, and
+# addresses nobody has read for ACCOUNT_IDLE seconds are dropped
+ACCOUNT_IDLE = 10 * FIGMENT_TTL
+account_plan = FetchPlan({}, parse=_parse_figment)
+
+
+@instrument("load")
+def get_account_info(address: str) -> dict:
+    name = f"accounts/{address}"
+    account_plan.evict(ACCOUNT_IDLE)
+    account_plan.add({name: Endpoint(f"{fig_url}/{name}", FIGMENT_TTL)})
+    return copy.deepcopy(account_plan.fetch([name])[name])
+
+
+@instrument("load")
+def get_blocks() -> pd.DataFrame:
+    return _figment_snapshot("blocks")
+
+
+@instrument("load")
+def get_epochs() -> pd.DataFrame:
+    return _figment_snapshot("epochs")
+
+
+@instrument("load")
+def get_validators() -> pd.DataFrame:
+    return _figment_snapshot("validators")
+
+
+# Epochs of each validator, kept in the query cache directory. Past epochs
+# don't change, so a refresh downloads pages (newest first) only until it
+# reaches a stored epoch, MAX_WORKERS pages at a time, and the newest epochs
+# replace their stored rows. Switching back to a validator within FIGMENT_TTL
+# doesn't make any request.
+EPOCH_KEY = "epoch"
+EPOCH_STORE = "validator_epochs"
+EPOCH_STORE_TTL = 365 * 24 * 3600
+_validator_epochs = {}
+_validator_epoch_locks = {}
+
+
+def _epoch_page(validator: str, page: int) -> dict:
+    r = session().get(
+        f"{fig_url}/validators/{validator}/epochs",
+        params={"page": page} if page > 1 else None,
+        timeout=TIMEOUT,
+    )
+    r.raise_for_status()
+    return r.json()
+
+
+def _new_epochs(validator: str, known: set) -> list:
+    """Records of the epochs newer than the ``known`` ones, and of the latest known ones"""
+    first = _epoch_page(validator, 1)
+    records = list(first["records"])
+    pages = first["pages"]
+    reached = any(x[EPOCH_KEY] in known for x in records)
+    # Pages up to the one expected to hold the newest known epoch, plus one
+    size = max(1, len(records))
+    expected = (pages * size - len(known)) // size + 2 if known else pages
+    page = 2
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        while not reached and page <= pages:
+            last = expected if page == 2 else page + MAX_WORKERS - 1
+            batch = range(page, min(pages, max(last, page)) + 1)
+            for result in pool.map(lambda x: _epoch_page(validator, x), batch):
+                records.extend(result["records"])
+                reached = reached or any(
+                    x[EPOCH_KEY] in known for x in result["records"]
+                )
+            page = batch[-1] + 1
+    return records
+
+
+def _epochs_frame(raw: pd.DataFrame) -> pd.DataFrame:
+    df = raw.copy()
     df["Staking Balance (NEAR)"] = convert_to_near(df.staking_balance)
     df["last_time"] = pd.to_datetime(df["last_time"])
     # Remove some dates which show up at the Unix Epoch
@@ -135,6 +221,227 @@ def get_validator_epochs(validator: str) -> pd.DataFrame:
     return df
 
 
+def _refresh_epoch_store(validator: str) -> pd.DataFrame:
+    """Raw stored epochs of ``validator``, with new pages added if older than FIGMENT_TTL"""
+    name = f"{EPOCH_STORE}-{validator}"
+    with entry_lock(name):
+        stored = read_frame(name)
+        if stored is not None and time.time() - stored[1]["fetched_at"] < FIGMENT_TTL:
+            # Refreshed by another process
+            return stored[0]
+        known = set() if stored is None else set(stored[0][EPOCH_KEY])
+        try:
+            new = pd.DataFrame(_new_epochs(validator, known))
+        except requests.RequestException as e:
+            if stored is None:
+                raise
+            logger.warning("Refreshing epochs of %s failed: %r", validator, e)
+            return stored[0]
+        raw = pd.concat(
+            [new, None if stored is None else stored[0]], ignore_index=True
+        ).drop_duplicates(EPOCH_KEY, ignore_index=True)
+        write_frame(name, raw, ttl=EPOCH_STORE_TTL)
+        return raw
+
+
+@instrument("load")
+def get_validator_epochs(validator: str) -> pd.DataFrame:
+    with _validator_epoch_locks.setdefault(validator, threading.Lock()):
+        entry = _validator_epochs.get(validator)
+        if entry is not None and time.time() - entry[0] < FIGMENT_TTL:
+            # Shared by every session, so each caller gets its own copy
+            return entry[1].copy()
+
+        df = _epochs_frame(_refresh_epoch_store(validator))
+        _validator_epochs[validator] = (time.time(), df)
+        return df.copy()
+
+
+# Network-wide history: epochs × validators arrays of EPOCH_METRICS, built
+# from the validators' stored epochs by a background backfill, so that network
+# series are array operations instead of one request per validator. Each
+# metric is stored as a table with one float64 column per validator, and read
+# back once per build into a single float64 block that the array views.
+EPOCH_METRICS = ["staking_balance", "produced_blocks", "efficiency"]
+STAKE_MATRIX = "stake_matrix"
+STAKE_MATRIX_TTL = 3600 * 12
+TOP_VALIDATORS = 10
+_stake_matrix = {}
+_backfill_lock = threading.Lock()
+_backfill = None
+
+
+class StakeMatrix(NamedTuple):
+    """Metrics of every validator at every epoch
+
+    ``epochs`` has the ``epoch`` id and ``last_time`` of each row, oldest
+    first, ``validators`` the account id of each column, and ``values`` an
+    epochs × validators float64 array for each of EPOCH_METRICS (NaN where a
+    validator has no record). Staking balances are in NEAR.
+    """
+
+    epochs: pd.DataFrame
+    validators: pd.Index
+    values: Mapping
+
+    def frame(self, metric: str) -> pd.DataFrame:
+        """``metric`` as a DataFrame indexed by epoch time, one column per validator"""
+        return pd.DataFrame(
+            self.values[metric],
+            index=pd.DatetimeIndex(self.epochs.last_time),
+            columns=self.validators,
+        )
+
+
+def _build_stake_matrix(validators: Iterable[str]) -> Optional[StakeMatrix]:
+    frames = []
+    for validator in validators:
+        entry = read_frame(f"{EPOCH_STORE}-{validator}")
+        if entry is not None:
+            frames.append(_epochs_frame(entry[0]).assign(validator=validator))
+    if not frames:
+        return None
+    df = pd.concat(frames, ignore_index=True)
+    df["staking_balance"] = df["Staking Balance (NEAR)"]
+    epochs = df.groupby(EPOCH_KEY)["last_time"].max().sort_values().reset_index()
+    validators = pd.Index(pd.unique(df.validator))
+    values = {}
+    for metric in EPOCH_METRICS:
+        wide = df.pivot(index=EPOCH_KEY, columns="validator", values=metric)
+        wide = wide.reindex(index=epochs[EPOCH_KEY], columns=validators)
+        values[metric] = wide.apply(pd.to_numeric, errors="coerce").to_numpy(float)
+    return StakeMatrix(epochs, validators, values)
+
+
+def _write_stake_matrix(matrix: StakeMatrix) -> None:
+    built_at = time.time()
+    with entry_lock(STAKE_MATRIX):
+        # Epochs last: readers only load metrics built with the stored epochs
+        for metric, values in matrix.values.items():
+            write_frame(
+                f"{STAKE_MATRIX}-{metric}",
+                pd.DataFrame(values, columns=matrix.validators),
+                ttl=STAKE_MATRIX_TTL,
+                built_at=built_at,
+            )
+        write_frame(
+            f"{STAKE_MATRIX}-epochs",
+            matrix.epochs,
+            ttl=STAKE_MATRIX_TTL,
+            built_at=built_at,
+        )
+
+
+@instrument("load")
+def get_stake_matrix() -> Optional[StakeMatrix]:
+    """The stored stake matrix, or None until :func:`backfill_stake_matrix` has built one"""
+    with entry_lock(STAKE_MATRIX):
+        entry = read_frame(f"{STAKE_MATRIX}-epochs")
+        if entry is None:
+            return _stake_matrix.get("matrix")
+        epochs, meta = entry
+        if _stake_matrix.get("built_at") == meta["built_at"]:
+            return _stake_matrix["matrix"]
+        values = {}
+        for metric in EPOCH_METRICS:
+            stored = read_frame(f"{STAKE_MATRIX}-{metric}")
+            if stored is None or stored[1].get("built_at") != meta["built_at"]:
+                return _stake_matrix.get("matrix")
+            # A view of the frame's single float64 block, not another copy
+            values[metric] = stored[0].to_numpy(float, copy=False)
+        validators = pd.Index(stored[0].columns)
+    _stake_matrix.update(
+        built_at=meta["built_at"], matrix=StakeMatrix(epochs, validators, values)
+    )
+    return _stake_matrix["matrix"]
+
+
+def backfill_stake_matrix(
+    validators: Optional[Iterable[str]] = None,
+) -> Optional[threading.Thread]:
+    """Refresh the stored epochs of ``validators`` and rebuild the stake matrix
+
+    Runs on a background thread, one validator at a time (each downloading
+    its missing pages in parallel), unless the stored matrix is younger than
+    STAKE_MATRIX_TTL. While a backfill is running, its thread is returned
+    instead of starting another one.
+
+    Parameters
+    ----------
+    validators : Iterable[str], optional
+        Account ids, by default the current validators from :func:`get_validators`.
+        Validators that have left the set are only covered if listed here
+
+    Returns
+    -------
+    threading.Thread
+        The backfill thread, or None if the matrix is up to date
+    """
+    global _backfill
+    validators = None if validators is None else list(validators)
+
+    def run():
+        try:
+            ids = validators
+            if ids is None:
+                ids = list(get_validators().account_id)
+            # Only the on-disk stores are refreshed, so the backfill doesn't
+            # keep every validator's epochs in this process's memory
+            for validator in ids:
+                try:
+                    _refresh_epoch_store(validator)
+                except Exception as e:
+                    logger.warning("Backfilling %s failed: %r", validator, e)
+            matrix = _build_stake_matrix(ids)
+            if matrix is not None:
+                _write_stake_matrix(matrix)
+        except Exception as e:
+            logger.warning("Building the stake matrix failed: %r", e)
+
+    with _backfill_lock:
+        if _backfill is not None and _backfill.is_alive():
+            return _backfill
+        matrix = get_stake_matrix()
+        built_at = _stake_matrix.get("built_at", 0)
+        if matrix is not None and time.time() - built_at < STAKE_MATRIX_TTL:
+            return None
+        _backfill = threading.Thread(target=run, daemon=True)
+        _backfill.start()
+        return _backfill
+
+
+@instrument()
+def network_stake_history(matrix: StakeMatrix, n: int = TOP_VALIDATORS) -> pd.DataFrame:
+    """Network totals for each epoch of ``matrix``
+
+    A validator is counted in an epoch if it has a positive stake. ``Joined``
+    and ``Left`` count validators entering and leaving the set since the
+    previous epoch, among the validators of the matrix.
+
+    Returns
+    -------
+    pd.DataFrame
+        ``epoch``, ``last_time``, ``Total Stake (NEAR)``, ``Top n Share``,
+        ``Validators``, ``Joined``, ``Left`` and ``Blocks Produced``
+    """
+    stake = np.nan_to_num(matrix.values["staking_balance"])
+    total = stake.sum(axis=1)
+    top = -np.sort(-stake, axis=1)[:, :n].sum(axis=1)
+    active = stake > 0
+    previous = np.vstack([active[:1], active[:-1]])
+
+    df = matrix.epochs.copy()
+    df["Total Stake (NEAR)"] = total
+    df[f"Top {n} Share"] = np.divide(
+        top, total, out=np.full(len(total), np.nan), where=total > 0
+    )
+    df["Validators"] = active.sum(axis=1)
+    df["Joined"] = (active & ~previous).sum(axis=1)
+    df["Left"] = (previous & ~active).sum(axis=1)
+    df["Blocks Produced"] = np.nansum(matrix.values["produced_blocks"], axis=1)
+    return df
+
+
 query_information = {
     "NEAR Number of Stakers": {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/24f17c14-f117-4848-b0d4-1365dc8bc347/data/latest",
@@ -149,7 +456,7 @@ query_information = {
 }
 
 
-@st.cache(ttl=(3600 * 6))
+@cached("load", ttl=(3600 * 6))
 def load_data(
     query_information: Mapping[str, Mapping[str, str]] = query_information
 ) -> Mapping[str, pd.DataFrame]:
@@ -166,11 +473,8 @@ def load_data(
         Dict of dataframes
     """
 
-    dfs = {}
-
-    for v in query_information.values():
-        df = pd.read_json(v["api"])
-        dfs[v["short_name"]] = df
+    urls = {v["short_name"]: v["api"] for v in query_information.values()}
+    dfs = read_queries(urls, ttl=3600 * 6)
 
     return dfs
 
@@ -216,6 +520,7 @@ validator_column_mappings = {
 }
 
 
+@instrument("chart")
 def alt_rank_bar(df: pd.DataFrame, value: str, ranks: tuple, mapping: dict):
     for k, v in mapping.items():
         if v["title"] == "Governor":
@@ -252,33 +557,6 @@ def alt_rank_bar(df: pd.DataFrame, value: str, ranks: tuple, mapping: dict):
     return chart
 
 
-def gini(array: np.array) -> float:
-    """Calculate the Gini coefficient of a numpy array.
-
-    From https://github.com/oliviaguest/gini
-
-    based on bottom eq:
-    http://www.statsdirect.com/help/generatedimages/equations/equation154.svg
-    from:
-    http://www.statsdirect.com/help/default.htm#nonparametric_methods/gini.htm
-    """
-    # All values are treated equally, arrays must be 1d:
-    array = array.flatten()
-    if np.amin(array) < 0:
-        # Values cannot be negative:
-        array -= np.amin(array)
-    # Values cannot be 0:
-    array += 0.0000001
-    # Values must be sorted:
-    array = np.sort(array)
-    # Index per array element:
-    index = np.arange(1, array.shape[0] + 1)
-    # Number of array elements:
-    n = array.shape[0]
-    # Gini coefficient:
-    return (np.sum((2 * index - n - 1) * array)) / (n * np.sum(array))
-
-
 val_daily_info_query = """
 --sql
 select
@@ -309,7 +587,7 @@ order by
 """
 
 
-@st.cache(ttl=12 * 60)
+@cached("load", ttl=12 * 60)
 def get_fs_validator_data(
     validator,
     base_query=val_daily_info_query,
@@ -321,6 +599,7 @@ def get_fs_validator_data(
     return df
 
 
+@instrument("chart")
 def alt_lines_bar(
     df: pd.DataFrame,
     validator: str,
@@ -329,12 +608,13 @@ def alt_lines_bar(
     variable_col="Stake (NEAR)",
     value_vars=["Blocks produced", "Transactions Processed"],
 ) -> alt.LayerChart:
-    melt_df = df.melt(id_vars=[date_col, variable_col], value_vars=value_vars)
-    base = alt.Chart(melt_df, title=f"Governance Track Record: {validator}").encode(
+    # Already wide: bars unpivot the value columns, the tooltip reads them directly
+    wide = df[[date_col, variable_col, *value_vars]]
+    base = alt.Chart(wide, title=f"Governance Track Record: {validator}").encode(
         x=alt.X(f"{date_type}({date_col}):T", axis=alt.Axis(title=""))
     )
 
-    columns = sorted(melt_df["variable"].unique())
+    columns = sorted(value_vars)
     selection = alt.selection_single(
         fields=[date_col],
         nearest=True,
@@ -345,24 +625,27 @@ def alt_lines_bar(
     lines = base.mark_line(color="#FFC107", interpolate="monotone").encode(
         y=alt.Y(variable_col),
     )
-    bars = base.mark_bar(interpolate="monotone", width=3).encode(
-        y=alt.Y(
-            "value",
-            title="Voting Record",
-        ),
-        color=alt.Color(
-            "variable",
-            title="Voting Record",
-            scale=alt.Scale(domain=columns, range=["#1E88E5", "#004D40"]),
-        ),
+    bars = (
+        base.transform_fold(
+            [escape_field(c) for c in columns], as_=["variable", "value"]
+        )
+        .mark_bar(interpolate="monotone", width=3)
+        .encode(
+            y=alt.Y(
+                "value:Q",
+                title="Voting Record",
+            ),
+            color=alt.Color(
+                "variable:N",
+                title="Voting Record",
+                scale=alt.Scale(domain=columns, range=["#1E88E5", "#004D40"]),
+            ),
+        )
     )
 
     points = lines.mark_point().transform_filter(selection)
     rule = (
-        base.transform_pivot(
-            "variable", value="value", groupby=[date_col, variable_col]
-        )
-        .mark_rule()
+        base.mark_rule()
         .encode(
             opacity=alt.condition(selection, alt.value(0.3), alt.value(0)),
             tooltip=[
@@ -371,8 +654,9 @@ def alt_lines_bar(
             ]
             + [
                 alt.Tooltip(
-                    c,
+                    escape_field(c),
                     type="quantitative",
+                    title=c,
                     format=",",
                 )
                 for c in columns
@@ -384,6 +668,23 @@ def alt_lines_bar(
     return chart.interactive()
 
 
+@instrument("chart")
+def alt_network_line(df: pd.DataFrame, value: str, val_format: str = ",.0f"):
+    chart = (
+        alt.Chart(df, title=value)
+        .mark_line(color="#004D40")
+        .encode(
+            x=alt.X("yearmonthdatehours(last_time):T", title=None),
+            y=alt.Y(value, title=value, axis=alt.Axis(format=val_format)),
+            tooltip=[
+                alt.Tooltip("yearmonthdatehours(last_time):T", title="Epoch end"),
+                alt.Tooltip(value, format=val_format),
+            ],
+        )
+    ).interactive()
+    return chart
+
+
 def alt_scatter(df, validator, variable_col):
     chart = (
         alt.Chart(df, title=f"Stake vs {variable_col}: {validator}")
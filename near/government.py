@@ -1,10 +1,10 @@
 import pandas as pd
 import streamlit as st
 from dateutil import parser
-from scipy.stats import spearmanr
 from shroomdk import errors
 
 from gov_utils import *
+from common.instrument import show_panel
 
 st.set_page_config(
     page_title="Citizens of NEAR: Local Government", page_icon="🌆", layout="wide"
@@ -87,6 +87,29 @@ with st.expander("Defintions"):
     - Gini Coefficient: a metric to quantify income inequality, see [here](https://github.com/oliviaguest/gini) for calculations and information
     """
     )
+
+st.subheader("Network history")
+"""
+Total staked NEAR and the share of the largest Governors over every epoch, for the current validator set.
+"""
+backfill_stake_matrix()
+stake_matrix = get_stake_matrix()
+if stake_matrix is None:
+    st.info(
+        "The validators' epoch history is being collected, check back in a few minutes."
+    )
+else:
+    network_history = network_stake_history(stake_matrix, n=10)
+    c1, c2 = st.columns(2)
+    c1.altair_chart(
+        alt_network_line(network_history, "Total Stake (NEAR)"),
+        use_container_width=True,
+    )
+    c2.altair_chart(
+        alt_network_line(network_history, "Top 10 Share", val_format=".1%"),
+        use_container_width=True,
+    )
+
 st.subheader("The Governors")
 """
 Information about the NEAR Governors (the active validator set) below.
@@ -151,7 +174,14 @@ c1.altair_chart(
     use_container_width=True,
 )
 # TODO: add proportion of stake instead of stake? may need more complex analysis though
-corr = spearmanr(df["Stake (NEAR)"], df[var])
+def stake_correlation(df, var):
+    # scipy is only needed here, so it is imported when this section renders
+    from scipy.stats import spearmanr
+
+    return spearmanr(df["Stake (NEAR)"], df[var])
+
+
+corr = stake_correlation(df, var)
 c2.altair_chart(
     alt_scatter(df, validator, var).properties(height=500),
     use_container_width=True,
@@ -204,3 +234,5 @@ st.altair_chart(
 # validator_epochs
 # "account_info"
 # account_info
+
+show_panel()
@@ -6,6 +6,7 @@ import streamlit as st
 
 import near_info
 from journey_utils import *
+from common.instrument import show_panel
 
 st.set_page_config(
     page_title="Citizens of NEAR: The Journeymen", page_icon="🌆", layout="wide"
@@ -60,7 +61,7 @@ near_user = fs_data["near_user"].copy()
 most_recent_full_day = near_user.sort_values(by="CREATION_DATE").iloc[-2]
 c1, c2 = st.columns([1, 3])
 c1.write(
-    f"**Metrics for the most recent full day ({most_recent_full_day.CREATION_DATE})**"
+    f"**Metrics for the most recent full day ({most_recent_full_day.CREATION_DATE:%Y-%m-%d})**"
 )
 c1.metric(f"New Users", f"{int(most_recent_full_day.NEW_USERS):,}")
 c1.metric(f"Cumulative New Users", f"{int(most_recent_full_day.CUMULATIVE_USERS):,}")
@@ -77,7 +78,6 @@ We can see which type of transaction is done first by a user. We can choose betw
 - `Sent`: the first transaction where the user's address is the *transaction sender*. This means a user initiated or sent out a transaction.
 """
 first_method = fs_data["first_method"].copy()
-first_method["USER_COUNT"] = pd.to_numeric(first_method["USER_COUNT"])
 c1, c2 = st.columns([3, 1])
 tx_type = c2.selectbox(
     "Choose transaction type:",
@@ -94,13 +94,6 @@ st.write(
 )
 rainbow = fs_data["rainbow"].copy()
 rainbow = rainbow.replace("nan", pd.NA)
-rainbow["NUMBER_OF_BRIDGE_TX"] = pd.to_numeric(rainbow["NUMBER_OF_BRIDGE_TX"])
-rainbow["TOTAL_AMOUNT_BRIDGED"] = pd.to_numeric(rainbow["TOTAL_AMOUNT_BRIDGED"])
-rainbow["AVERAGE_AMOUNT_BRIDGED"] = pd.to_numeric(rainbow["AVERAGE_AMOUNT_BRIDGED"])
-rainbow["NUMBER_OF_TOKENS_BRIDGED"] = pd.to_numeric(rainbow["NUMBER_OF_TOKENS_BRIDGED"])
-rainbow["TOTAL_SENDERS"] = pd.to_numeric(rainbow["TOTAL_SENDERS"])
-rainbow["TOTAL_RECEIVERS"] = pd.to_numeric(rainbow["TOTAL_RECEIVERS"])
-rainbow["LATEST_BALANCE_ETHEREUM"] = pd.to_numeric(rainbow["LATEST_BALANCE_ETHEREUM"])
 
 rainbow_totals = rainbow[rainbow.VARIABLE == "total"].reset_index(drop=True).iloc[0]
 
@@ -384,3 +377,5 @@ with st.expander("Data tables"):
     for k, v in fs_data.items():
         st.subheader(k)
         v
+
+show_panel()
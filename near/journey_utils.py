@@ -1,9 +1,15 @@
+import sys
 from collections.abc import Mapping
+from pathlib import Path
 
 import altair as alt
-import numpy as np
 import pandas as pd
-import streamlit as st
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_queries
+from common.downsample import MAX_POINTS, downsample_area
+from common.instrument import cached, instrument
+from common.stats import gini
 
 # from shroomdk import ShroomDK
 
@@ -34,50 +40,41 @@ query_information = {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/ef747a3f-26e0-4d37-a875-103360fa12e1/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/ef747a3f-26e0-4d37-a875-103360fa12e1",
         "short_name": "near_user",
+        "schema": {
+            "CREATION_DATE": "datetime",
+            "NEW_USERS": "int",
+            "CUMULATIVE_USERS": "int",
+            "CUMULATIVE_AVERAGE_DAILY_NEW_USERS": "float32",
+        },
     },
     "NEAR User: First Method": {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/172c237c-faec-4aa8-ad93-5a97a2b2b6d0/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/172c237c-faec-4aa8-ad93-5a97a2b2b6d0",
         "short_name": "first_method",
+        "schema": {
+            "TX_TYPE": "category",
+            "USER_COUNT": "int",
+        },
     },
     "Rainbow Bridge": {
         "api": "https://node-api.flipsidecrypto.com/api/v2/queries/439ecbf1-dc9e-4fe7-912a-70695119c7d1/data/latest",
         "query": "https://app.flipsidecrypto.com/velocity/queries/439ecbf1-dc9e-4fe7-912a-70695119c7d1",
         "short_name": "rainbow",
+        "schema": {
+            "NUMBER_OF_BRIDGE_TX": "int",
+            "TOTAL_AMOUNT_BRIDGED": "float",
+            "AVERAGE_AMOUNT_BRIDGED": "float",
+            "NUMBER_OF_TOKENS_BRIDGED": "int",
+            "TOTAL_SENDERS": "int",
+            "TOTAL_RECEIVERS": "int",
+            "LATEST_BALANCE_ETHEREUM": "float",
+        },
     },
 }
 
 
-# Utilities
-def gini(array: np.array) -> float:
-    """Calculate the Gini coefficient of a numpy array.
-
-    From https://github.com/oliviaguest/gini
-
-    based on bottom eq:
-    http://www.statsdirect.com/help/generatedimages/equations/equation154.svg
-    from:
-    http://www.statsdirect.com/help/default.htm#nonparametric_methods/gini.htm
-    """
-    # All values are treated equally, arrays must be 1d:
-    array = array.flatten()
-    if np.amin(array) < 0:
-        # Values cannot be negative:
-        array -= np.amin(array)
-    # Values cannot be 0:
-    array += 0.0000001
-    # Values must be sorted:
-    array = np.sort(array)
-    # Index per array element:
-    index = np.arange(1, array.shape[0] + 1)
-    # Number of array elements:
-    n = array.shape[0]
-    # Gini coefficient:
-    return (np.sum((2 * index - n - 1) * array)) / (n * np.sum(array))
-
-
 # Data
-@st.cache(ttl=(3600 * 12), allow_output_mutation=True)
+@cached("load", ttl=(3600 * 12), allow_output_mutation=True)
 def load_data(
     query_information: Mapping[str, Mapping[str, str]] = query_information
 ) -> Mapping[str, pd.DataFrame]:
@@ -94,16 +91,19 @@ def load_data(
         Dict of dataframes
     """
 
-    dfs = {}
-
-    for v in query_information.values():
-        df = pd.read_json(v["api"], dtype=str)
-        dfs[v["short_name"]] = df
+    urls = {v["short_name"]: v["api"] for v in query_information.values()}
+    schemas = {
+        v["short_name"]: v["schema"]
+        for v in query_information.values()
+        if "schema" in v
+    }
+    dfs = read_queries(urls, ttl=3600 * 12, schemas=schemas, dtype=str)
 
     return dfs
 
 
 # Charting
+@instrument("chart")
 def alt_user_chart(df):
     base = alt.Chart(df, title="NEAR New Users").encode(
         x=alt.X("CREATION_DATE:T", axis=alt.Axis(title=""))
@@ -171,6 +171,7 @@ def alt_user_chart(df):
     return chart
 
 
+@instrument("chart")
 def alt_ordered_bar(df, tx_type):
     df = df[df.TX_TYPE == tx_type]
     df = df.sort_values(by="USER_COUNT", ascending=False).reset_index(drop=True)
@@ -200,7 +201,9 @@ def alt_ordered_bar(df, tx_type):
     return chart
 
 
-def alt_date_area(df, metric):
+@instrument("chart")
+def alt_date_area(df, metric, max_points=MAX_POINTS):
+    df = downsample_area(df, "Date", metric, max_points=max_points)
     chart = (
         alt.Chart(df)
         .mark_area(color="#054480")
@@ -220,6 +223,7 @@ def alt_date_area(df, metric):
     return chart
 
 
+@instrument("chart")
 def alt_ordered_bar_receiver(df, metric, ordering):
     df = df.dropna()
     df = df.sort_values(by=metric, ascending=ordering).reset_index(drop=True)
@@ -276,6 +280,7 @@ def alt_ordered_bar_receiver(df, metric, ordering):
     return chart
 
 
+@instrument("chart")
 def alt_ordered_bar_sender(df, metric, ordering):
     df = df.dropna()
     df = df.sort_values(by=metric, ascending=ordering).reset_index(drop=True)
@@ -2,7 +2,13 @@ import altair as alt
 from collections.abc import Mapping
 import datetime
 import pandas as pd
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.charts import escape_field, pivot_wide
+from common.data_cache import read_queries
 
 
 query_information = {
@@ -58,8 +64,11 @@ def load_data(
 
     dfs = []
 
-    for v in query_information.values():
-        df = pd.read_json(v["api"])
+    results = read_queries(
+        {k: v["api"] for k, v in query_information.items()}, ttl=60 * 30
+    )
+    for k, v in query_information.items():
+        df = results[k]
         df["blockchain"] = v["blockchain"]
         dfs.append(df)
 
@@ -86,10 +95,11 @@ def alt_line_chart(data: pd.DataFrame, colname: str, log_scale=True) -> alt.Char
         Chart showing columnname values, and a multiline tooltip on mouseover
     """
     scale = "log" if log_scale else "linear"
-    base = alt.Chart(data).encode(
+    wide, columns = pivot_wide(data, "datetime", "blockchain", colname)
+    columns = sorted(columns)
+    base = alt.Chart(wide).encode(
         x=alt.X("yearmonthdate(datetime):T", axis=alt.Axis(title=""))
     )
-    columns = sorted(data.blockchain.unique())
     selection = alt.selection_single(
         fields=["datetime"],
         nearest=True,
@@ -97,24 +107,32 @@ def alt_line_chart(data: pd.DataFrame, colname: str, log_scale=True) -> alt.Char
         empty="none",
         clear="mouseout",
     )
-    lines = base.mark_line().encode(
-        y=alt.Y(
-            colname,
-            axis=alt.Axis(title=colname.replace("_", " ").title()),
-            scale=alt.Scale(type=scale),
-        ),
-        color=alt.Color(
-            "blockchain:N",
-        ),
+    lines = (
+        base.transform_fold(
+            [escape_field(c) for c in columns], as_=["blockchain", colname]
+        )
+        .mark_line()
+        .encode(
+            y=alt.Y(
+                f"{colname}:Q",
+                axis=alt.Axis(title=colname.replace("_", " ").title()),
+                scale=alt.Scale(type=scale),
+            ),
+            color=alt.Color(
+                "blockchain:N",
+            ),
+        )
     )
     points = lines.mark_point().transform_filter(selection)
     rule = (
-        base.transform_pivot("blockchain", value=colname, groupby=["datetime"])
-        .mark_rule()
+        base.mark_rule()
         .encode(
             opacity=alt.condition(selection, alt.value(0.3), alt.value(0)),
             tooltip=[alt.Tooltip("datetime", title="Date")]
-            + [alt.Tooltip(c, type="quantitative", format=",") for c in columns],
+            + [
+                alt.Tooltip(escape_field(c), type="quantitative", format=",", title=c)
+                for c in columns
+            ],
         )
         .add_selection(selection)
     )
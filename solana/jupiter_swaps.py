@@ -3,8 +3,12 @@ from email.policy import default
 import altair as alt
 import numpy as np
 import pandas as pd
-from scipy.stats import spearmanr
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
 
 
 st.title("Most Popular Jupiter Swaps")
@@ -119,7 +123,7 @@ def plot_by_date(source, title, label):
 def load_data():
     q = "6392e078-4836-4cd8-9551-a3346b2cae06"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    df = pd.read_json(url)
+    df = read_query(url)
 
     # we'll only look at address labels
     df = df[
@@ -1,6 +1,11 @@
 import altair as alt
-import pandas as pd
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.instrument import show_panel, start_section
 
 st.title("Contractually Obligated")
 st.caption(
@@ -17,17 +22,19 @@ Grand prize-winning submissions will assess both!"""
 def load_data():
     q = "1c1f031e-7264-4c3e-ad66-c7c7783f05da"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    top20_df = pd.read_json(url)
+    top20_df = read_query(url, ttl=3600 * 6)
 
     q = "e9fbecd3-d5b0-4850-aec1-f62de32a4660"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    by_protocol_df = pd.read_json(url)
+    by_protocol_df = read_query(url, ttl=3600 * 6)
 
     return top20_df, by_protocol_df
 
 
+start_section("Load data")
 top20_df, by_protocol_df = load_data()
 
+start_section("Overview")
 st.header("Overview")
 f"""
 Following up on our [previous analysis](https://share.streamlit.io/ltirrell/flipside_bounties/main/terra/feet_wet_p2.py), we are now going to investigate some of the top smart contracts.
@@ -44,6 +51,7 @@ We'll look at:
 - Mars
 """
 
+start_section("Top 20 Contract Addresses")
 st.header("Top 20 Contract Addresses")
 
 
@@ -140,6 +148,7 @@ chart = (
 st.altair_chart(chart, use_container_width=True)
 
 
+start_section("Top 2 contracts per protocol")
 st.header("Top 2 contracts per protocol")
 st.subheader("By Transactions")
 
@@ -235,6 +244,7 @@ st.altair_chart(chart, use_container_width=True)
 # st.altair_chart(chart, use_container_width=True)
 
 
+start_section("Methods")
 st.header("Methods")
 """
 The wallets that made their first transactions were selected for using a query based on [this one](https://discord.com/channels/784442203187314689/856566159692136468/950485826842820618).
@@ -248,3 +258,5 @@ Queries were done on using Flipside crypto, and are linked here:
 - [Top 20 contracts](https://app.flipsidecrypto.com/velocity/queries/1c1f031e-7264-4c3e-ad66-c7c7783f05da)
 - [Top 2 by protocol](https://app.flipsidecrypto.com/velocity/queries/e9fbecd3-d5b0-4850-aec1-f62de32a4660)
 """
+
+show_panel()
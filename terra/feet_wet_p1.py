@@ -1,6 +1,11 @@
 import altair as alt
-import pandas as pd
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.instrument import show_panel, start_section
 
 st.title("Getting Your Feet Wet, Part 1")
 st.caption(
@@ -26,7 +31,7 @@ def load_data():
     ]
     for q in qs:
         url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-        df = pd.read_json(url)
+        df = read_query(url, ttl=3600 * 6)
         dfs.append(df.copy())
 
     df = dfs[0].merge(dfs[1], how="outer", on="WALLET")
@@ -35,7 +40,7 @@ def load_data():
     # summary info
     q = "c1d82778-7da8-4304-8751-b4b76325c008"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    summary = pd.read_json(url)
+    summary = read_query(url, ttl=3600 * 6)
 
     for x in summary.columns:
         summary.rename(columns={x: x.title().replace("_", " ")}, inplace=True)
@@ -44,17 +49,19 @@ def load_data():
     # tx_type value counts
     q = "295c07cc-5222-4e6c-bd56-80f8b28725c3"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    tx_type_value_counts = pd.read_json(url)
+    tx_type_value_counts = read_query(url, ttl=3600 * 6)
 
     q = "1b858e2c-9db0-49bd-9c3e-465c56ccac27"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    all_df = pd.read_json(url)
+    all_df = read_query(url, ttl=3600 * 6)
 
     return df, summary, tx_type_value_counts, all_df
 
 
+start_section("Load data")
 df, summary, tx_type_value_counts, all_df = load_data()
 
+start_section("Overview")
 st.header("Overview")
 
 f"""
@@ -107,6 +114,7 @@ Note that for this, and all other tables, only the top 100,000 rows are used, as
 
 st.dataframe(all_df)
 
+start_section("Wallet behavior")
 st.header("Wallet behavior")
 """
 We'll investigate some of the behavior of the new users.
@@ -192,6 +200,7 @@ The number of wallets using each Transaction Type is shown below (there is a sli
 st.dataframe(tx_type_value_counts)
 
 
+start_section("Methods")
 st.header("Methods")
 """
 The wallets that made their first transactions were selected for using a query based on [this one](https://discord.com/channels/784442203187314689/856566159692136468/950485826842820618).
@@ -212,3 +221,5 @@ Queries were done on using Flipside crypto, and are linked here:
 """
 st.subheader("Summary Table")
 st.table(summary.T)
+
+show_panel()
@@ -1,6 +1,12 @@
 import altair as alt
 import pandas as pd
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.instrument import show_panel, start_section
 
 st.title("Getting Your Feet Wet, Part 2")
 st.caption(
@@ -31,11 +37,12 @@ Also include the following projects inyour analysis
 def load_data():
     q = "6ad7225c-594b-4b4e-bc5b-7c25124ffa11"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    df = pd.read_json(url)
+    df = read_query(url, ttl=3600 * 6)
 
     return df
 
 
+start_section("Overview")
 st.header("Overview")
 
 f"""
@@ -53,11 +60,13 @@ We looked at the following Protocols/Platforms:
 - [Knowhere](https://knowhere.art/): NFT Marketplace
 """
 
+start_section("Load data")
 df = load_data()
 
 m = df.melt()
 
 # transacations
+start_section("Transactions")
 st.subheader("Transactions")
 
 tx = m[m.variable.str.contains("TX")]
@@ -100,6 +109,7 @@ chart = (
 st.altair_chart(chart, use_container_width=True)
 
 # users
+start_section("Users")
 st.subheader("Users")
 weekly = m[m.variable.str.contains("WEEKLY")]
 weekly["Protocol"] = weekly.variable.str.split("_", expand=True)[1].apply(str.title)
@@ -150,6 +160,7 @@ chart = (
 st.altair_chart(chart, use_container_width=True)
 
 
+start_section("Methods")
 st.header("Methods")
 """
 The wallets that made their first transactions were selected for using a query based on [this one](https://discord.com/channels/784442203187314689/856566159692136468/950485826842820618).
@@ -165,3 +176,5 @@ Queries were done on using Flipside crypto, and are linked here:
 """
 # st.subheader("Summary Table")
 # st.table(summary.T)
+
+show_panel()
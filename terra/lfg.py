@@ -1,14 +1,18 @@
 import datetime
+from pathlib import Path
+import sys
 
-import networkx as nx
 import numpy as np
 import pandas as pd
-from pyvis.network import Network
 from PIL import Image
 import requests
 import streamlit as st
 import streamlit.components.v1 as components
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.instrument import show_panel, start_section
+
 
 st.set_page_config(page_title="LFG!", page_icon="🌕")
 
@@ -16,15 +20,15 @@ st.set_page_config(page_title="LFG!", page_icon="🌕")
 def load_data():
     q = "16137f94-d5de-4ce9-8e8e-6734691fc42b"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    vesting = pd.read_json(url)
+    vesting = read_query(url, ttl=4800)
 
     q = "514babaa-91a0-400d-b72a-ecbd3b796780"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    net_data_terra = pd.read_json(url)
+    net_data_terra = read_query(url, ttl=4800)
 
     q = "0b6a2281-1bed-4de0-b872-1c2fc474fde9"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    net_data_eth = pd.read_json(url)
+    net_data_eth = read_query(url, ttl=4800)
 
     net_data = pd.concat([net_data_terra, net_data_eth]).reset_index(drop=True)
     net_data["BLOCK_TIMESTAMP"] = pd.to_datetime(net_data.BLOCK_TIMESTAMP)
@@ -42,11 +46,11 @@ def load_data():
 
     q = "63749e53-fe73-4608-ab5e-040c8e89a093"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    gnosis = pd.read_json(url)
+    gnosis = read_query(url, ttl=4800)
 
     q = "83945792-fbd4-4ab3-a09d-7bd079dc6078"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    eth_balances = pd.read_json(url)
+    eth_balances = read_query(url, ttl=4800)
 
     # q = "927f77c7-2537-4c92-af68-c24f3ce701cc"
     # url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
@@ -80,6 +84,8 @@ def subset_network(df, date_range):
 
 
 def create_network(df):
+    # networkx is slow to import, only load it once the network section renders
+    import networkx as nx
 
     edges_df = df.copy()
     edges_df["title"] = edges_df[["AMOUNT_USD", "TX_ID", "AMOUNT", "CURRENCY"]].apply(
@@ -142,6 +148,8 @@ def create_network(df):
 
 
 def net_viz(G):
+    from pyvis.network import Network
+
     nt = Network(
         directed=True,
         bgcolor="#051212",
@@ -171,6 +179,7 @@ In a short few weeks since it was found, LFG has made a large impact:
 Let's F'ing Go investigate how LFG has been using its funding to support its mission of estabilishing a decentralized UST reserve pool.
 """
 
+start_section("Load data")
 # load and process data
 (
     vesting,
@@ -190,6 +199,7 @@ grouped_net_df = subset_network(
     ),
 )
 
+start_section("LFG Transaction Graph")
 st.header("LFG Transaction Graph")
 
 date_range = st.slider(
@@ -243,6 +253,7 @@ Values without a '\$' are in native currency, and are always as accurate as the
 """
 
 
+start_section("Key Wallets and Metrics")
 st.header("Key Wallets and Metrics")
 
 st.subheader("LFG Bitcoin Reserve 🏦")
@@ -391,6 +402,7 @@ for i, c in enumerate(cols):
 
 cols[-1].metric("Total Value", f"${current_gnosis_df.AMOUNT_USD.sum():,.0f}")
 "-----"
+start_section("Discussion")
 st.header("Discussion")
 f"""
 LFG has burned {grouped_net_df[grouped_net_df.TO_LABEL=='terra: mints & burns'].AMOUNT.sum():,.0f} LUNA for UST, and used this to fund Anchor and rebalance the UST-3Pool on Curve.
@@ -434,3 +446,5 @@ col1.caption(f"Last updated: {last_ran}")
 image = Image.open("./terra/media/flipside.png")
 col2.image(image, width=50)
 col3.caption("Powered by [Flipside Crypto](https://flipsidecrypto.xyz/)")
+
+show_panel()
@@ -1,17 +1,20 @@
 # %%
 import datetime
+from pathlib import Path
+import sys
 
 import altair as alt
-import networkx as nx
 import numpy as np
 import pandas as pd
-from pyvis.network import Network
 from PIL import Image
 import requests
-from scipy.stats import kendalltau
 import streamlit as st
 import streamlit.components.v1 as components
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.instrument import show_panel, start_section
+
 
 st.set_page_config(page_title="LUNAr Lander", page_icon="🌕")
 # %%
@@ -64,7 +67,7 @@ def get_time_off_peg(s: pd.Series) -> str:
 def load_initial_data():
     q = "77bd19d6-0c7c-4ce8-83c2-e7162adf2cb4"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    prices = pd.read_json(url)
+    prices = read_query(url, ttl=7200)
 
     price_dict = {}
     p = prices.copy().sort_values(by="DATETIME", ascending=False).reset_index(drop=True)
@@ -74,7 +77,7 @@ def load_initial_data():
 
     q = "c3d0aee6-2d96-4aa4-901a-5104d6588eee"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    staking = pd.read_json(url)
+    staking = read_query(url, ttl=7200)
 
     return price_dict, staking
 
@@ -84,7 +87,7 @@ def load_flipside_data():
 
     q = "69a171bd-0db3-44e0-9526-93692270d081"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    stables = pd.read_json(url)
+    stables = read_query(url, ttl=7200)
 
     p = prices[["DATETIME", "UST_PRICE"]]
     p["SYMBOL"] = "UST"
@@ -104,18 +107,18 @@ def load_flipside_data():
     # feet wet p1
     q = "c1d82778-7da8-4304-8751-b4b76325c008"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    summary = pd.read_json(url)
+    summary = read_query(url, ttl=7200)
 
     q = "c6cb88f8-6d6b-4d52-8f94-5e2b4f523af1"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    join_date = pd.read_json(url)
+    join_date = read_query(url, ttl=7200)
     join_date = join_date.sort_values(by="JOIN_DATE").reset_index()
     join_date["CUMULATIVE"] = join_date.NEW_USERS.cumsum()
     join_date["JOIN_DATE"] = pd.to_datetime(join_date.JOIN_DATE)
 
     q = "4f6342fe-87b9-4e4c-a9d3-6ad352d490f4"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    join_date_all = pd.read_json(url)
+    join_date_all = read_query(url, ttl=7200)
     join_date_all = join_date_all.sort_values(by="JOIN_DATE").reset_index()
     join_date_all["CUMULATIVE"] = join_date_all.NEW_USERS.cumsum()
     join_date_all["JOIN_DATE"] = pd.to_datetime(join_date_all.JOIN_DATE)
@@ -123,7 +126,7 @@ def load_flipside_data():
     # feet wet p2
     q = "6ad7225c-594b-4b4e-bc5b-7c25124ffa11"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    df = pd.read_json(url)
+    df = read_query(url, ttl=7200)
 
     m = df.melt()
     tx = m[m.variable.str.contains("TX")]
@@ -141,18 +144,18 @@ def load_flipside_data():
 
     q = "a63088ff-0105-4bbe-bdc7-a9d048f16649"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    ust_supply = pd.read_json(url)
+    ust_supply = read_query(url, ttl=7200)
 
     all_users = pd.concat([users, weekly])
 
     # contractually
     q = "1c1f031e-7264-4c3e-ad66-c7c7783f05da"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    top20_df = pd.read_json(url)
+    top20_df = read_query(url, ttl=7200)
 
     q = "e9fbecd3-d5b0-4850-aec1-f62de32a4660"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    by_protocol_df = pd.read_json(url)
+    by_protocol_df = read_query(url, ttl=7200)
 
     for x in summary.columns:
         summary.rename(columns={x: x.title().replace("_", " ")}, inplace=True)
@@ -161,11 +164,11 @@ def load_flipside_data():
     # lfg
     q = "514babaa-91a0-400d-b72a-ecbd3b796780"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    net_data_terra = pd.read_json(url)
+    net_data_terra = read_query(url, ttl=7200)
 
     q = "0b6a2281-1bed-4de0-b872-1c2fc474fde9"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    net_data_eth = pd.read_json(url)
+    net_data_eth = read_query(url, ttl=7200)
 
     net_data = pd.concat([net_data_terra, net_data_eth]).reset_index(drop=True)
     net_data["BLOCK_TIMESTAMP"] = pd.to_datetime(net_data.BLOCK_TIMESTAMP)
@@ -266,6 +269,7 @@ image = Image.open(
 col.image(image, use_column_width="auto")
 st.caption("Created by [@ltirrell_](https://twitter.com/ltirrell_)")
 
+start_section("Load data")
 data = load_lcd_data()
 
 price_dict, staking = load_initial_data()
@@ -280,6 +284,7 @@ data["staking_yield"] = staking_nona.loc[
     staking_nona.DATE == staking_nona.DATE.max()
 ].APR.values[0]
 
+start_section("Summary")
 with st.expander("Summary", expanded=True):
     st.header("Current blockchain status")
     col1, col2 = st.columns(2)
@@ -333,6 +338,7 @@ data_load_state.text("")
 stables = stable_dict["Max"]
 
 # %%
+start_section("Square peg, round hole?")
 with st.expander("Square peg, round hole? UST vs. the 💲 Peg", expanded=True):
     st.header("UST Peg Stability")
     # """
@@ -588,10 +594,13 @@ with st.expander("Square peg, round hole? UST vs. the 💲 Peg", expanded=True):
 
 
 # %%
+start_section("Supply and Demand")
 with st.expander("Supply and Demand 📈", expanded=True):
     st.header("UST Supply and LUNA price")
     col1, col2 = st.columns([4, 2])
     col1.write("LUNA is burned to create UST, increasing the scarcity of LUNA.")
+    from scipy.stats import kendalltau
+
     corr = kendalltau(ust_supply.PRICE, ust_supply.TOTAL_BALANCE)
     col2.metric("UST Supply - LUNA price correlation", f"{corr.correlation:.2f}")
 
@@ -631,6 +640,7 @@ with st.expander("Supply and Demand 📈", expanded=True):
 
 
 # %%
+start_section("To the moon")
 with st.expander("To the moon 🚀🌕! User metrics", expanded=True):
     st.header("User Metrics")
     base = alt.Chart(join_date_all).encode(x=alt.X("JOIN_DATE:T", title=""))
@@ -963,6 +973,7 @@ with st.expander("To the moon 🚀🌕! User metrics", expanded=True):
     st.altair_chart(alt.hconcat(chart1, chart2), use_container_width=True)
 
 # %%
+start_section("The Stablest?")
 with st.expander("The Stablest?", expanded=True):
     st.subheader("UST compared to other stablecoins")
 
@@ -1058,6 +1069,7 @@ with st.expander("The Stablest?", expanded=True):
     col1.caption("Weekly rolling average")
 
 # %%
+start_section("LFG!")
 with st.expander("LFG! 🌝", expanded=True):
     st.header("LUNA Foundation Guard")
     f"""
@@ -1082,6 +1094,8 @@ with st.expander("LFG! 🌝", expanded=True):
         return grouped_net_df
 
     def create_network(df):
+        # networkx is slow to import, only load it for this section
+        import networkx as nx
 
         edges_df = df.copy()
         edges_df["title"] = edges_df[
@@ -1145,6 +1159,9 @@ with st.expander("LFG! 🌝", expanded=True):
         return G
 
     def net_viz(G):
+        # pyvis is slow to import, only load it for this section
+        from pyvis.network import Network
+
         nt = Network(
             directed=True,
             bgcolor="#051212",
@@ -1175,6 +1192,7 @@ with st.expander("LFG! 🌝", expanded=True):
 
 
 # %%
+start_section("Sources and References")
 with st.expander("Sources and References 📜"):
     st.header("Data Sources")
     f"""
@@ -1275,3 +1293,5 @@ col3.caption("Powered by [Flipside Crypto](https://flipsidecrypto.xyz/)")
 # # prices["LUNA_DAILY"] = prices.LUNA_PRICE.rolling(24).mean()
 # prices["LUNA_WEEKLY"] = prices.LUNA_PRICE.rolling(24 * 7).mean()
 # prices['LUNA_MONTHLY'] = prices.LUNA_PRICE.rolling(24*7*30).mean()
+
+show_panel()
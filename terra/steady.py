@@ -1,12 +1,14 @@
 from collections import defaultdict
 import altair as alt
-from arch import arch_model
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from scipy.stats import kendalltau, linregress
+from pathlib import Path
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.instrument import show_panel, start_section
 
 
 def get_price(symbol, df):
@@ -40,7 +42,7 @@ color_map = {
 def load_data():
     q = "acf6805b-94ff-4b8e-bd67-db1fc58b43eb"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    df = pd.read_json(url)
+    df = read_query(url)
 
     df_daily = (
         df.set_index("DATETIME", drop=True)
@@ -125,6 +127,7 @@ def load_data():
     return df_daily
 
 
+start_section("Load data")
 df_daily = load_data()
 
 st.title("Steady As She Goes")
@@ -147,6 +150,7 @@ Our main comparison will focus on the data since the start of 2022, when the mar
 We'll also include date starting since the launch of Columbus-5 on Terra (on 30-Sep-2021), as a good starting point for anything related to Terra price action.
 """
 
+start_section("Price data overview")
 st.subheader("Price data overview")
 """
 In the first chart below, we show the price of the assets on a log scale (so that all can be seen at once).
@@ -279,6 +283,7 @@ overlaid_price_chart = (
 st.altair_chart(overlaid_price_chart, use_container_width=True)
 
 # ----
+start_section("Daily Returns")
 st.subheader("Daily Returns")
 
 pos = (
@@ -295,6 +300,13 @@ Daily returns were calculated for the assets, as well as an estimate of volatili
 """
 
 # Daily Returns
+# The plotting and modelling libraries are slow to import, so they are loaded
+# here rather than at the top, after the price overview has rendered
+from arch import arch_model
+import matplotlib.pyplot as plt
+import seaborn as sns
+from scipy.stats import kendalltau, linregress
+
 preds = dict()
 models = dict()
 fig, axes = plt.subplots(7, 1, figsize=(8, 12), sharex=True, sharey=True)
@@ -613,11 +625,13 @@ fig.text(
     weight="semibold",
 )
 st.pyplot(fig)
+start_section("Summary")
 st.subheader("Summary")
 """
 Overall, recent trends suggest that LUNA is correlated with the basket of other similiar crypto assets we chose.
 However the price has generally moved in a farvorable direction more often.
 """
+start_section("Methods")
 st.subheader("Methods")
 """
 SQL query [here](https://app.flipsidecrypto.com/velocity/queries/acf6805b-94ff-4b8e-bd67-db1fc58b43eb), selecting price data from Ethereum tables when available.
@@ -625,3 +639,5 @@ Luna oracle prices were used for LUNA prices, and SOL swaps against stablecoins
 Code is on GitHub [here](https://github.com/ltirrell/flipside_bounties/blob/main/terra/steady.py)
 """
 st.dataframe(df_daily)
+
+show_panel()
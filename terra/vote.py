@@ -5,8 +5,14 @@ from typing import List
 import altair as alt
 import numpy as np
 import pandas as pd
+from pathlib import Path
 import requests
 import streamlit as st
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from common.data_cache import read_query
+from common.instrument import show_panel, start_section
 
 LCD = "https://lcd.terra.dev"
 
@@ -20,7 +26,7 @@ st.caption(
 def load_data():
     q = "20f89eaa-e7f5-42b9-834f-45027923775a"
     url = f"https://api.flipsidecrypto.com/api/v2/queries/{q}/data/latest"
-    df = pd.read_json(url)
+    df = read_query(url, ttl=7200)
     df = df.sort_values(by=["PROPOSAL_ID", "DATETIME"])
     df = df.drop_duplicates(["VOTER", "PROPOSAL_ID"], keep="last")
 
@@ -171,11 +177,13 @@ def get_proposal_info(df, proposal_status):
     return titles, sub_df.reset_index(drop=True)
 
 
+start_section("Load data")
 df = load_data()
 proposal_df, merged_df = load_proposal_data()
 open_proposals = proposal_df[proposal_df.status == "PROPOSAL_STATUS_VOTING_PERIOD"]
 
 
+start_section("LUNA governance overview")
 st.header("LUNA governance overview")
 st.write(
     """
@@ -665,6 +673,7 @@ mean = (
 )
 st.altair_chart(chart2 + hline + mean, use_container_width=True)
 
+start_section("Proposal Details")
 st.header("Proposal Details")
 status_dict = {
     "Voting (Active)": "PROPOSAL_STATUS_VOTING_PERIOD",
@@ -709,6 +718,7 @@ for i, x in sub_df.iterrows():
         if x.status == "PROPOSAL_STATUS_DEPOSIT_PERIOD":
             st.write(f"**Submit Time*: {x['submit_time']:%Y-%m-%d}")
 
+start_section("Methods")
 st.header("Methods")
 st.write(
     """
@@ -725,3 +735,5 @@ In the `terra.gov_vote` table, the voting power is not accurate for the validato
 Thanks to user hfuhruhurr#8781 (on Flipside Crypto Discord) for discussions on this topic!
 """
 )
+
+show_panel()